@@ -0,0 +1,116 @@
+from __future__ import print_function
+
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from vad_reader import VADFile, VWPCube
+from params import compute_parameters, compute_parameters_batch
+from plot import plot_hodograph, plot_vwp
+from synth_nvw import make_nvw
+
+"""
+bench.py
+Microbenchmarks for the parsing, parameter and plotting code, run on synthetic
+NVW files from synth_nvw.py so the numbers can be compared between releases
+without any network access. Each benchmark reports the time per call and per
+1,000 profiles (the best of several repeats).
+"""
+
+def _best_time(func, num_calls, repeat):
+    best = None
+    for rep in range(repeat):
+        start = time.perf_counter()
+        for idx in range(num_calls):
+            func(idx)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run_benchmarks(num_profiles=200, num_levels=30, vcp=212, num_pages=1, num_plots=5, vwp_columns=28, repeat=3):
+    """
+    Run the benchmarks and return a list of result dicts (name, calls,
+    profiles per call, seconds per call and seconds per 1000 profiles).
+    """
+    start = datetime(2020, 5, 1, 12)
+    times = [ start + timedelta(minutes=5 * idx) for idx in range(num_profiles) ]
+    products = [ make_nvw(t, vcp=vcp, num_levels=num_levels, num_pages=num_pages, seed=idx) for idx, t in enumerate(times) ]
+    vads = [ VADFile(product) for product in products ]
+    for vad in vads:
+        vad.rid = 'KLOT'
+
+    def _compute_parameters(idx):
+        # Start from scratch, rather than the profile's cached winds
+        vads[idx]._wind = None
+        compute_parameters(vads[idx], 'right-mover')
+
+    cube = VWPCube(vads, times)
+    params = [ compute_parameters(vad, 'right-mover') for vad in vads[:num_plots] ]
+    vwp_data = vads[:vwp_columns][::-1]
+    vwp_times = times[:vwp_columns][::-1]
+
+    tmp_dir = tempfile.mkdtemp()
+    benchmarks = [
+        ('VADFile', num_profiles, 1, lambda idx: VADFile(products[idx])),
+        ('VADFile._get_data', num_profiles, 1, lambda idx: vads[idx]._get_data()),
+        ('compute_parameters', num_profiles, 1, _compute_parameters),
+        ('compute_parameters_batch', 1, num_profiles, lambda idx: compute_parameters_batch(cube, 'right-mover')),
+        ('plot_hodograph', num_plots, 1, lambda idx: plot_hodograph(vads[idx], params[idx], fname="%s/hodo.png" % tmp_dir, archive=True)),
+        ('plot_vwp', 1, len(vwp_data), lambda idx: plot_vwp(vwp_data, vwp_times, [], fname="%s/vwp.png" % tmp_dir, archive=True)),
+    ]
+
+    results = []
+    try:
+        for name, num_calls, per_call, func in benchmarks:
+            elapsed = _best_time(func, num_calls, repeat)
+            results.append({
+                'name': name,
+                'calls': num_calls,
+                'profiles_per_call': per_call,
+                'sec_per_call': elapsed / num_calls,
+                'sec_per_1000': elapsed / (num_calls * per_call) * 1000,
+            })
+    finally:
+        shutil.rmtree(tmp_dir)
+    return results
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('-n', '--profiles', dest='profiles', type=int, default=200, help="Number of profiles for the parsing and parameter benchmarks. Defaults to 200.")
+    ap.add_argument('-l', '--levels', dest='levels', type=int, default=30, help="Number of levels in each profile. Defaults to 30.")
+    ap.add_argument('-v', '--vcp', dest='vcp', type=int, default=212, help="VCP of the synthetic files. Defaults to 212.")
+    ap.add_argument('--pages', dest='pages', type=int, default=1, help="Number of VAD Algorithm Output pages per file. Defaults to 1.")
+    ap.add_argument('--plots', dest='plots', type=int, default=5, help="Number of hodographs to plot. Defaults to 5.")
+    ap.add_argument('--columns', dest='columns', type=int, default=28, help="Number of columns in the VWP. Defaults to 28.")
+    ap.add_argument('-r', '--repeat', dest='repeat', type=int, default=3, help="Number of times to repeat each benchmark (the best is kept). Defaults to 3.")
+    ap.add_argument('--json', dest='json', help="Also write the results to this JSON file.")
+    args = ap.parse_args()
+
+    np.seterr(all='ignore')
+    results = run_benchmarks(num_profiles=args.profiles, num_levels=args.levels, vcp=args.vcp, num_pages=args.pages,
+        num_plots=min(args.plots, args.profiles), vwp_columns=min(args.columns, args.profiles), repeat=args.repeat)
+
+    print("%-26s %8s %14s %16s" % ("Benchmark", "Calls", "ms/call", "s/1000 profiles"))
+    for result in results:
+        print("%-26s %8d %14.3f %16.3f" % (result['name'], result['calls'], result['sec_per_call'] * 1000, result['sec_per_1000']))
+
+    if args.json is not None:
+        report = {
+            'settings': {'profiles': args.profiles, 'levels': args.levels, 'vcp': args.vcp, 'pages': args.pages, 'repeat': args.repeat},
+            'python': sys.version.split()[0],
+            'numpy': np.__version__,
+            'results': results,
+        }
+        with open(args.json, 'w') as fjson:
+            json.dump(report, fjson, indent=2)
+
+if __name__ == "__main__":
+    main()
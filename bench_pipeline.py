@@ -0,0 +1,148 @@
+from __future__ import print_function
+
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import contextlib
+from glob import glob
+from datetime import timedelta
+
+import numpy as np
+
+import main as pipeline
+from nvw_server import NVWServer
+from nids_store import NIDSStore
+
+"""
+bench_pipeline.py
+Times the whole main.py pipeline (find_files, download_files, inflate_files,
+run_vad and run_vwp) against a local stand-in server (see nvw_server.py)
+instead of THREDDS. Each combination of download and render workers is run
+in turn, and the wall time of each stage and the overall throughput are
+reported. Latency and errors can be injected into the server's responses.
+"""
+
+_stages = ['find_files', 'download_files', 'inflate_files', 'run_vad', 'run_vwp']
+
+def run_pipeline(server, download_workers, render_workers, fetch_only=False, quiet=True, store=None):
+    """
+    Run the pipeline once against server and return a dict of stage timings
+    and counts. Downloads skip the local store unless one is given.
+    """
+    radar_id = server.radar_id
+    catalogue_base = "%s/%s/level3/NVW/" % (server.thredds_base, server.type_)
+    download_base = "%s/fileServer/%s/level3/NVW/" % (server.thredds_base, server.type_)
+    start_time = server.times[0].strftime('%Y%m%d/%H')
+    end_time = (server.times[-1] + timedelta(hours=1)).strftime('%Y%m%d/%H')
+
+    pipeline._catalog_cache.clear()
+    requests_before, errors_before, bytes_before = server.num_requests, server.num_errors, server.bytes_sent
+
+    output_path = tempfile.mkdtemp(prefix='bench_pipeline_')
+    os.mkdir(output_path + '/plots')
+
+    timings = {}
+    output = io.StringIO() if quiet else sys.stdout
+    try:
+        with contextlib.redirect_stdout(output):
+            stage_start = time.perf_counter()
+            files = pipeline.find_files(radar_id, start_time, end_time, catalogue_base, workers=download_workers)
+            timings['find_files'] = time.perf_counter() - stage_start
+
+            stage_start = time.perf_counter()
+            pipeline.download_files(files, start_time, end_time, download_base, workers=download_workers, output_path=output_path, store=store)
+            timings['download_files'] = time.perf_counter() - stage_start
+            num_downloaded = len(glob(output_path + '/*.nids'))
+
+            stage_start = time.perf_counter()
+            pipeline.inflate_files(radar_id, files, output_path)
+            timings['inflate_files'] = time.perf_counter() - stage_start
+
+            if not fetch_only:
+                stage_start = time.perf_counter()
+                pipeline.run_vad(output_path, radar_id, 'right-mover', None, workers=render_workers)
+                timings['run_vad'] = time.perf_counter() - stage_start
+
+                stage_start = time.perf_counter()
+                pipeline.run_vwp(output_path, radar_id)
+                timings['run_vwp'] = time.perf_counter() - stage_start
+
+        num_images = len(glob(output_path + '/plots/*.png'))
+    finally:
+        shutil.rmtree(output_path)
+
+    total = sum(timings.values())
+    return {
+        'download_workers': download_workers,
+        'render_workers': render_workers,
+        'scans': len(server.times),
+        'files_found': len(files),
+        'files_downloaded': num_downloaded,
+        'images': num_images,
+        'requests': server.num_requests - requests_before,
+        'injected_errors': server.num_errors - errors_before,
+        'bytes': server.bytes_sent - bytes_before,
+        'stages': timings,
+        'total': total,
+        'scans_per_sec': len(server.times) / total if total > 0 else float('nan'),
+    }
+
+
+def _worker_list(arg):
+    return [ int(val) for val in arg.split(',') ]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('-r', '--radar-id', dest='radar_id', default='KLOT', help="Radar to serve files for. Defaults to KLOT.")
+    ap.add_argument('-n', '--num-scans', dest='num_scans', type=int, default=48, help="Number of scans to serve. Defaults to 48.")
+    ap.add_argument('-d', '--download-workers', dest='download_workers', type=_worker_list, default=[1, 4, 8], help="Comma-separated numbers of download workers to try. Defaults to 1,4,8.")
+    ap.add_argument('-w', '--render-workers', dest='render_workers', type=_worker_list, default=[1], help="Comma-separated numbers of render processes to try. Defaults to 1.")
+    ap.add_argument('-l', '--latency', dest='latency', type=float, default=0.05, help="Seconds to delay each response. Defaults to 0.05.")
+    ap.add_argument('-j', '--jitter', dest='jitter', type=float, default=0., help="Up to this many more seconds of random delay. Defaults to 0.")
+    ap.add_argument('-e', '--error-rate', dest='error_rate', type=float, default=0., help="Fraction of requests answered with an HTTP 503. Defaults to 0.")
+    ap.add_argument('--store', dest='store', action='store_true', help="Use a (new, temporary) local store, so runs after the first take their files from it.")
+    ap.add_argument('--fetch-only', dest='fetch_only', action='store_true', help="Stop after inflate_files (no plotting).")
+    ap.add_argument('-v', '--verbose', dest='verbose', action='store_true', help="Show the pipeline's own output.")
+    ap.add_argument('--json', dest='json', help="Also write the results to this JSON file.")
+    args = ap.parse_args()
+
+    np.seterr(all='ignore')
+
+    store = None
+    if args.store:
+        store = NIDSStore(tempfile.mkdtemp(prefix='bench_store_'))
+
+    results = []
+    with NVWServer(args.radar_id.upper(), num_scans=args.num_scans, latency=args.latency, jitter=args.jitter,
+                   error_rate=args.error_rate) as server:
+        for download_workers in args.download_workers:
+            for render_workers in ([ None ] if args.fetch_only else args.render_workers):
+                results.append(run_pipeline(server, download_workers, render_workers, fetch_only=args.fetch_only, quiet=not args.verbose, store=store))
+
+    if store is not None:
+        shutil.rmtree(store.root)
+
+    stages = [ stage for stage in _stages if stage in results[0]['stages'] ]
+    print(("%4s %4s " + "%14s " * len(stages) + "%9s %8s %6s %9s") % (('dl', 'rend') + tuple(stages) + ('total (s)', 'scans/s', 'files', 'errors')))
+    for result in results:
+        row = (result['download_workers'], result['render_workers'] or 0) + tuple(result['stages'][stage] for stage in stages)
+        row += (result['total'], result['scans_per_sec'], result['files_downloaded'], result['injected_errors'])
+        print(("%4d %4d " + "%14.3f " * len(stages) + "%9.3f %8.2f %6d %9d") % row)
+
+    if args.json is not None:
+        report = {
+            'settings': {'radar_id': args.radar_id.upper(), 'num_scans': args.num_scans, 'latency': args.latency,
+                         'jitter': args.jitter, 'error_rate': args.error_rate},
+            'results': results,
+        }
+        with open(args.json, 'w') as fjson:
+            json.dump(report, fjson, indent=2)
+
+if __name__ == "__main__":
+    main()
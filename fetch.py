@@ -0,0 +1,176 @@
+from __future__ import print_function
+
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import http.client as httplib
+from urllib.parse import urlsplit, urljoin
+
+import runstats
+
+"""
+fetch.py
+Bounded-concurrency HTTP(S) downloads. Each worker thread keeps its own
+keep-alive connection per host, so a batch of files from the same server pays
+for one TCP/TLS handshake per worker instead of one per file. Failed requests
+are retried with exponential backoff.
+"""
+
+_retry_status = [408, 429, 500, 502, 503, 504]
+_redirect_status = [301, 302, 303, 307, 308]
+_max_redirects = 5
+
+class FetchError(IOError):
+    def __init__(self, msg, status=None):
+        super(FetchError, self).__init__(msg)
+        self.status = status
+
+
+class Downloader(object):
+    def __init__(self, workers=8, retries=3, backoff=0.5, timeout=30):
+        self.workers = max(1, int(workers))
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self._local = threading.local()
+
+        # Every connection opened by any thread, so close() can reach them
+        self._conns = []
+        self._conns_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Close every connection this downloader has opened. It can still be
+        used afterwards; connections are opened again as needed.
+        """
+        with self._conns_lock:
+            conns, self._conns = self._conns, []
+        for conn in conns:
+            conn.close()
+
+    def _connection(self, scheme, netloc):
+        if not hasattr(self._local, 'conns'):
+            self._local.conns = {}
+
+        key = (scheme, netloc)
+        if key not in self._local.conns:
+            if scheme == 'https':
+                conn = httplib.HTTPSConnection(netloc, timeout=self.timeout)
+            else:
+                conn = httplib.HTTPConnection(netloc, timeout=self.timeout)
+            self._local.conns[key] = conn
+            with self._conns_lock:
+                self._conns.append(conn)
+        return self._local.conns[key]
+
+    def _drop_connection(self, scheme, netloc):
+        conn = self._local.conns.pop((scheme, netloc), None)
+        if conn is not None:
+            conn.close()
+            with self._conns_lock:
+                if conn in self._conns:
+                    self._conns.remove(conn)
+
+    def _request(self, url):
+        parts = urlsplit(url)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+
+        conn = self._connection(parts.scheme, parts.netloc)
+        try:
+            conn.request('GET', path, headers={'Connection': 'keep-alive'})
+            resp = conn.getresponse()
+            body = resp.read()
+        except (socket.error, httplib.HTTPException):
+            # Stale keep-alive connections show up here. Start fresh next time.
+            self._drop_connection(parts.scheme, parts.netloc)
+            raise
+
+        if resp.getheader('connection', '').lower() == 'close':
+            self._drop_connection(parts.scheme, parts.netloc)
+        return resp.status, resp.getheader('location'), body
+
+    def get(self, url):
+        """
+        Return the body of `url`, retrying connection errors and transient HTTP
+        errors with exponential backoff. Raises FetchError on failure.
+        """
+        error = None
+        for attempt in range(self.retries + 1):
+            if attempt > 0:
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+
+            try:
+                target = url
+                for redirect in range(_max_redirects + 1):
+                    status, location, body = self._request(target)
+                    if status not in _redirect_status or location is None:
+                        break
+                    target = urljoin(target, location)
+            except (socket.error, httplib.HTTPException) as exc:
+                error = FetchError("Could not download %s (%s)" % (url, exc))
+                continue
+
+            if status == 200:
+                return body
+
+            error = FetchError("HTTP %d downloading %s" % (status, url), status=status)
+            if status not in _retry_status:
+                break
+        raise error
+
+    def get_many(self, urls):
+        """
+        Download several URLs concurrently. Returns a list of (url, body, error)
+        tuples in the same order as `urls`; exactly one of body and error is None.
+        """
+        def _get(url):
+            try:
+                return url, self.get(url), None
+            except FetchError as exc:
+                return url, None, exc
+
+        # The pool's threads (and so their connections) end with this call
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                return list(pool.map(_get, urls))
+        finally:
+            self.close()
+
+    def download_many(self, jobs):
+        """
+        Download (url, path) pairs concurrently, writing each body to its path.
+        Returns a list of (path, error) tuples; error is None on success.
+        """
+        def _download(job):
+            url, path = job
+            with runstats.span('download', file=os.path.basename(path)) as span:
+                try:
+                    body = self.get(url)
+                except FetchError as exc:
+                    span['error'] = str(exc)
+                    return path, exc
+
+                # Write to a temporary name first so a failed run never leaves
+                # a truncated file behind.
+                with open(path + '.part', 'wb') as fout:
+                    fout.write(body)
+                os.replace(path + '.part', path)
+                span['bytes'] = len(body)
+            return path, None
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                return list(pool.map(_download, jobs))
+        finally:
+            self.close()
@@ -0,0 +1,188 @@
+from __future__ import print_function
+
+import os
+import time
+import argparse
+import traceback
+from datetime import datetime, timedelta
+
+import numpy as np
+
+try:
+    from urllib.request import urlopen
+except ImportError:
+    from urllib2 import urlopen
+
+from wsr88d import nexrads, nwswfos
+from vad_reader import VADFile, inflate_nids, find_file_times, _base_url
+from fetch import Downloader
+from main import base, find_files, DOWNLOAD_WORKERS
+from vad import _plot_vad
+from plot import VWPRenderer
+
+"""
+live.py
+Keeps the hodograph and VWP for a radar up to date during active weather. The
+THREDDS catalogue (or the tgftp listing) is polled on an interval, and only
+scans that haven't been seen before are downloaded and plotted. The VWP figure
+is kept in memory, so each new scan adds one column to it instead of the whole
+VWP being redrawn.
+"""
+
+def _thredds_scans(radar_id, lookback):
+    """
+    (scan time, url) for the NVW files on THREDDS from the last `lookback`
+    hours, oldest first.
+    """
+    type_ = 'nexrad' if radar_id in nexrads else 'terminal'
+    catalogue_base = "%s/%s/level3/NVW/" % (base, type_)
+    download_base = "%s/fileServer/%s/level3/NVW/" % (base, type_)
+
+    now = datetime.utcnow()
+    start = (now - timedelta(hours=lookback)).strftime('%Y%m%d/%H')
+    end = now.strftime('%Y%m%d/%H')
+
+    scans = []
+    for f in find_files(radar_id, start, end, catalogue_base, ttl=0):
+        scan_time = datetime.strptime(f[-13:], '%Y%m%d_%H%M')
+        url = "%s/%s/%s/%s.nids" % (download_base, f[7:10], f[15:23], f)
+        scans.append((scan_time, url))
+    return sorted(scans)
+
+
+def _tgftp_scans(radar_id):
+    """
+    (file time, url) for the NVW files in the tgftp listing, oldest first.
+    """
+    scans = [ (file_time, "%s/SI.%s/%s" % (_base_url, radar_id.lower(), file_name))
+              for file_name, file_time in find_file_times(radar_id) ]
+    return sorted(scans)
+
+
+class LivePlotter(object):
+    def __init__(self, radar_id, out_path, source='thredds', storm_motion='right-mover', sfc_wind=None,
+                 fixed=False, num_columns=28, workers=DOWNLOAD_WORKERS):
+        self.radar_id = radar_id
+        self.out_path = out_path
+        self.source = source
+        self.storm_motion = storm_motion
+        self.sfc_wind = sfc_wind
+        self.fixed = fixed
+        self.num_columns = num_columns
+        self.workers = workers
+
+        self._seen = set()
+        self._vwp = VWPRenderer(radar_id, num_columns=num_columns)
+
+        if not os.path.exists(out_path):
+            os.makedirs(out_path)
+
+    def _list_scans(self):
+        if self.source == 'tgftp':
+            return _tgftp_scans(self.radar_id)
+
+        # Enough of the catalogue to fill the VWP, assuming ~5 minute volumes
+        lookback = max(1, int(np.ceil(self.num_columns * 6 / 60.)))
+        return _thredds_scans(self.radar_id, lookback)
+
+    def _fetch(self, urls):
+        if self.source == 'tgftp':
+            products = []
+            for url in urls:
+                try:
+                    products.append((url, urlopen(url, timeout=30).read(), None))
+                except IOError as exc:
+                    products.append((url, None, exc))
+            return products
+        with Downloader(workers=self.workers) as downloader:
+            return downloader.get_many(urls)
+
+    def poll(self):
+        """
+        Check for new scans, plot any that haven't been seen and update the VWP.
+        Returns the list of images written.
+        """
+        scans = [ scan for scan in self._list_scans() if scan[0] not in self._seen ]
+        if len(self._seen) == 0:
+            # First time through, back-fill the VWP but don't plot hodographs
+            # for the whole listing.
+            self._seen.update(scan_time for scan_time, url in scans[:-self.num_columns])
+            scans = scans[-self.num_columns:]
+
+        fnames = []
+        for (scan_time, url), (_, product, error) in zip(scans, self._fetch([ url for scan_time, url in scans ])):
+            if error is not None:
+                # Not marked as seen, so it's tried again on the next poll
+                print("Download failed: %s" % (error))
+                continue
+
+            # A bad product is still marked as seen; downloading it again won't help
+            try:
+                product = inflate_nids(product)
+                stamp = scan_time.strftime('%Y%m%d%H%M')
+                with open("%s/K%s_SDUS34_NVW%s_%s" % (self.out_path, nwswfos[self.radar_id], self.radar_id[1:], stamp), 'wb') as fnvw:
+                    fnvw.write(product)
+
+                vad = VADFile(product)
+                self._vwp.add_profile(vad, scan_time)
+
+                fname = "%s/%s_%s_vad.png" % (self.out_path, self.radar_id, stamp)
+                _plot_vad(vad, self.radar_id, self.storm_motion, self.sfc_wind, fname, False, self.fixed, False)
+                fnames.append(fname)
+            except Exception as exc:
+                print("Could not plot '%s': %s" % (url, exc))
+                traceback.print_exc()
+            self._seen.add(scan_time)
+
+        if len(fnames) > 0:
+            fname = "%s/%s_vwp.png" % (self.out_path, self.radar_id)
+            self._vwp.save(fname)
+            fnames.append(fname)
+        return fnames
+
+    def run(self, interval=60):
+        while True:
+            start = time.time()
+            try:
+                for fname in self.poll():
+                    print("Wrote %s" % fname)
+            except Exception as exc:
+                # Keep going; the next poll may well work
+                print("Poll failed: %s" % (exc))
+                traceback.print_exc()
+            time.sleep(max(0, interval - (time.time() - start)))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('radar_id', help="The 4-character identifier for the radar (e.g. KTLX, KFWS, etc.)")
+    ap.add_argument('-o', '--out-dir', dest='out_dir', help="Directory for the data and images. Defaults to live_<radar_id>.")
+    ap.add_argument('-i', '--interval', dest='interval', type=int, default=60, help="Seconds between checks for new scans. Defaults to 60.")
+    ap.add_argument('-m', '--storm-motion', dest='storm_motion', default='right-mover', help="Storm motion vector, as for vad.py.")
+    ap.add_argument('-s', '--sfc-wind', dest='sfc_wind', help="Surface wind vector, as for vad.py.")
+    ap.add_argument('-x', '--fixed-frame', dest='fixed', action='store_true')
+    ap.add_argument('-c', '--columns', dest='columns', type=int, default=28, help="Number of scans in the VWP. Defaults to 28.")
+    ap.add_argument('--tgftp', dest='tgftp', action='store_true', help="Poll the NWS tgftp server instead of THREDDS.")
+    ap.add_argument('--once', dest='once', action='store_true', help="Check for new scans once and exit.")
+    args = ap.parse_args()
+
+    np.seterr(all='ignore')
+    radar_id = args.radar_id.upper()
+    out_path = args.out_dir if args.out_dir is not None else "live_%s" % radar_id
+
+    plotter = LivePlotter(radar_id, out_path,
+        source='tgftp' if args.tgftp else 'thredds',
+        storm_motion=args.storm_motion,
+        sfc_wind=args.sfc_wind,
+        fixed=args.fixed,
+        num_columns=args.columns
+    )
+
+    if args.once:
+        for fname in plotter.poll():
+            print("Wrote %s" % fname)
+    else:
+        plotter.run(interval=args.interval)
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,7 @@
 #
 # This script will fetch archived (up to ~30 days) Level 3 NVW files from the UCAR
-# THREDDS server, inflate them using Daryl Herzmann's ucnids.c tool, and then plot
-# the associated hodographs. The hodograph plotting itself is driven completely by
+# THREDDS server, inflate them (as Daryl Herzmann's ucnids.c tool does), and then
+# plot the associated hodographs. The hodograph plotting itself is driven completely by
 # Tim Supinie's excellent vad-plotter scripts, with some modifications to allow
 # plotting of NFLOW-based VWPs.
 #
@@ -12,6 +12,11 @@
 #       7/7/2020    -   Added quick data query & readout at start of execution
 #       7/7/2020    -   Added TDWR plotting capabilities. Improved archive option.
 #       7/9/2020    -   Output data now zipped to allow easier downloading.
+#       10/17/2026  -   NIDS files now inflated in-process with zlib (no ucnids).
+#       10/17/2026  -   Inflated products parsed from memory to fill the parse cache.
+#       10/17/2026  -   Images written into the output zip as they're plotted.
+#       10/17/2026  -   Per-stage timings written to a JSON run report.
+#       10/17/2026  -   Downloaded files kept in a local store (see nids_store.py).
 #
 # USEAGE and OUTPUT:
 #       Please see the README.md for more information.
@@ -19,29 +24,60 @@
 
 from datetime import datetime, timedelta
 
-try:
-    import urllib2 as urlreq
-except ImportError:
-    import urllib.request as urlreq
-
 from glob import glob
 import os, sys, shutil
+import time
+import calendar
 import re
 import argparse
+import traceback
 import numpy as np
-import zipfile as zf
 
 from wsr88d import nexrads, tdwrs, nwswfos
-
-HOME_DIR = os.environ['PWD']
-ucnids = HOME_DIR + "/./ucnids"
+from vad_reader import inflate_nids
+from vad_cache import load_vad
+from fetch import Downloader
+from vad import vad_plotter_batch
+from vwp import vwp_plotter
+from zipsink import ZipSink
+from nids_store import NIDSStore
+import runstats
+
+HOME_DIR = os.getcwd()
 base = "https://thredds.ucar.edu/thredds"
 reg_string = "<tt>([\w]{5}[\d]{1}_[\w]{3}_[\w]{3}_[\d]{8}_[\d]{4}).nids"
+DOWNLOAD_WORKERS = 8        # Number of simultaneous downloads from THREDDS
+RENDER_WORKERS = os.cpu_count() or 1  # Number of processes plotting hodographs
+CATALOG_TTL = 300           # Seconds before an unfinished day's catalogue listing is re-fetched
+ZIP_DATA = True             # Include the NVW data files in the output zip
+RUN_REPORT = True           # Write stage timings to <output>_report.json
+LOG_SPANS = False           # Also log each stage timing as a JSON line on stderr
+STORE = 'default'           # Local store of downloaded files ('default', a NIDSStore, or None to always download)
+
+# Parsed catalogue listings, keyed by URL: (fetch time, list of files)
+_catalog_cache = {}
+
+# Default for download_files' store, so STORE is looked up when it's called
+_default_store = object()
+
+def _store():
+    """
+    The local store in STORE. The default one is only created when it's first
+    needed, so importing this module (e.g. from live.py) has no side effects.
+    """
+    global STORE
+    if STORE == 'default':
+        STORE = NIDSStore()
+    return STORE
 
-def inflate_files(radar_id, files, output_path):
+def inflate_files(radar_id, files, output_path, sink=None):
     """
-    Pass the downloaded .nids files through the ucnids binary to inflate/
-    decompress into python-readable format for passing to vad and vwp scripts
+    Inflate/decompress the downloaded .nids files into python-readable format
+    for passing to vad and vwp scripts. Equivalent to `ucnids -r`, but done
+    in-process with zlib. The inflated bytes are parsed straight away, which
+    fills the parse cache (see vad_cache.py), so run_vad and vwp.py don't
+    have to parse them again. The inflated files are still written out for
+    vwp.py and the zip, and each one is passed to sink, if given.
     """
     files = glob(output_path + '/*.nids')
     for f in files:
@@ -52,17 +88,31 @@ def inflate_files(radar_id, files, output_path):
         oname = "K%s_SDUS34_NVW%s_%s%s" % (wfo, radar_id[1:], date[0:8], date[9:13])
 
         print("Inflating: %s to %s" % (f, oname))
-        arg = "%s -r %s %s/%s" % (ucnids, f, output_path, oname)
-        os.system(arg)
+        with runstats.span('inflate', file=oname) as span:
+            with open(f, 'rb') as nids:
+                product = inflate_nids(nids)
+            with open("%s/%s" % (output_path, oname), 'wb') as out:
+                out.write(product)
+            span['bytes'] = len(product)
+
+        with runstats.span('parse', file=oname, bytes=len(product)):
+            try:
+                load_vad(product)
+            except Exception as exc:
+                print("Could not parse %s: %s" % (oname, exc))
+        if sink is not None:
+            sink("%s/%s" % (output_path, oname))
 
         # Remove the original .nids files
-        arg = "rm %s" % (f)
-        os.system(arg)
+        os.remove(f)
 
-def find_files(radar_id, start_time, end_time, catalogue_base):
+def find_files(radar_id, start_time, end_time, catalogue_base,
+               workers=DOWNLOAD_WORKERS, ttl=CATALOG_TTL):
     """
     Query the THREDDS server catalogue listing and return the available .nids
-    NVW files. If none exist, return an empty list
+    NVW files. If none exist, return an empty list. The daily catalogues are
+    fetched concurrently and cached (see _catalog_cache); any fetched before
+    their day was over are re-fetched once they're more than `ttl` seconds old.
     """
     start = datetime.strptime(start_time, '%Y%m%d/%H')
     end = datetime.strptime(end_time, '%Y%m%d/%H')
@@ -74,93 +124,145 @@ def find_files(radar_id, start_time, end_time, catalogue_base):
         temp_start += timedelta(hours=1)
     num_days = len(days_list)
 
-    file_list = []
+    # A listing fetched after its day ended never changes, so it's cached for
+    # the life of the process. Any other listing is re-fetched after `ttl`
+    # seconds.
+    urls = []
     for i in range(num_days+1):
         date = start + timedelta(days=int(i), minutes=0, seconds=0)
         date_str = date.strftime("%Y%m%d")
         url = ("%s/%s/%s/catalog.html") % (catalogue_base, radar_id[-3:],
                                            date_str)
+        urls.append(url)
+
+        if url in _catalog_cache:
+            fetch_time, files = _catalog_cache[url]
+            day_end = calendar.timegm(date.date().timetuple()) + 24 * 3600
+            if fetch_time < day_end and time.time() - fetch_time >= ttl:
+                del _catalog_cache[url]
+
+    # Search the catalogues for available .nids files using regular
+    # expressions. A 404 just means there's no data for that day.
+    to_fetch = [url for url in urls if url not in _catalog_cache]
+    with runstats.span('find_files', count=len(to_fetch)) as span:
+        span['bytes'] = 0
+        for url, body, error in Downloader(workers=workers).get_many(to_fetch):
+            if error is None:
+                files = re.findall(reg_string, body.decode('utf-8'))
+                files.sort()
+                span['bytes'] += len(body)
+            elif error.status == 404:
+                files = []
+            else:
+                print("Catalogue search failed: %s" % (error))
+                continue
+            _catalog_cache[url] = (time.time(), files)
 
-        # Search the catalogue for available .nids files using regular
-        # expressions. May need more robust exception handling here...
-        try:
-            req = urlreq.Request(url)
-            result = urlreq.urlopen(req)
-            txt = result.read().decode('utf-8')
-            files = re.findall(reg_string, txt)
-            files.sort()
-            file_list.extend(files)
-        except:
-            pass
+    file_list = []
+    for url in urls:
+        if url in _catalog_cache:
+            file_list.extend(_catalog_cache[url][1])
     return file_list
 
-def download_files(files, start_time, end_time, download_base):
+def download_files(files, start_time, end_time, download_base,
+                   workers=DOWNLOAD_WORKERS, output_path=None, store=_default_store):
     """
-    Download the requested files
+    Download the requested files. Up to `workers` files are fetched at once,
+    re-using connections to the server between files. Files go into
+    output_path, which defaults to a new data_<time> directory. Files already
+    in the local store (STORE, unless another is given; None for none) are
+    taken from there instead, and new downloads are added to it.
     """
+    if store is _default_store:
+        store = _store()
+
     start = datetime.strptime(start_time, '%Y%m%d/%H')
     end = datetime.strptime(end_time, '%Y%m%d/%H')
 
-    curr_date = datetime.strftime(datetime.now(), "%Y%m%d-%H%M")
-    output_path = HOME_DIR + "/data_" + curr_date
+    if output_path is None:
+        curr_date = datetime.strftime(datetime.now(), "%Y%m%d-%H%M")
+        output_path = HOME_DIR + "/data_" + curr_date
     if not os.path.exists(output_path):
         os.mkdir(output_path)
 
-    for f in files:
-        ID = f[7:10]
-        date_str = f[15:23]
-        hhmm = f[-4:]
-        dt = datetime.strptime(date_str+hhmm, '%Y%m%d%H%M')
-        if (start <= dt <= end) and not (os.path.exists(output_path + '/' + f + '.nids')):
-            target = ("%s/%s/%s/%s.nids") % (download_base, ID, date_str, f)
-            arg = "wget -q %s -O %s" % (target, output_path + '/' + f + '.nids')
-            print("Downloading: ", f, ".nids to ==>", output_path)
-            os.system(arg)
+    jobs = []
+    scans = {}
+    num_stored = 0
+    with runstats.span('store') as span:
+        for f in files:
+            ID = f[7:10]
+            date_str = f[15:23]
+            hhmm = f[-4:]
+            dt = datetime.strptime(date_str+hhmm, '%Y%m%d%H%M')
+            path = output_path + '/' + f + '.nids'
+            if (start <= dt <= end) and not (os.path.exists(path)):
+                if store is not None and store.copy_to(ID, f[11:14], dt, path):
+                    print("Using stored: ", f, ".nids")
+                    num_stored += 1
+                    continue
+
+                target = ("%s/%s/%s/%s.nids") % (download_base, ID, date_str, f)
+                print("Downloading: ", f, ".nids to ==>", output_path)
+                jobs.append((target, path))
+                scans[path] = (ID, f[11:14], dt)
+        span['count'] = num_stored
+
+    # Each file gets its own 'download' span (see fetch.py); this one covers
+    # the whole batch.
+    with runstats.span('download_all', count=len(jobs)) as span:
+        span['bytes'] = span['errors'] = 0
+        for path, error in Downloader(workers=workers).download_many(jobs):
+            if error is not None:
+                print("Download failed: %s" % (error))
+                span['errors'] += 1
+                continue
+
+            span['bytes'] += os.path.getsize(path)
+            if store is not None:
+                radar, product, dt = scans[path]
+                try:
+                    with open(path, 'rb') as fnids:
+                        store.put(radar, product, dt, fnids.read(), evict=False)
+                except (IOError, OSError) as exc:
+                    print("Could not store %s: %s" % (path, exc))
+
+    if store is not None and len(jobs) > 0:
+        store.evict()
 
     return output_path
 
-def run_vad(output_path, radar_id, storm_motion, sfc_wind):
+def run_vad(output_path, radar_id, storm_motion, sfc_wind, workers=RENDER_WORKERS,
+            sink=None):
     """
-    Automatically run the vad.py script (with all default settings). Images will be
-    saved in the same directory data was downloaded into.
+    Plot hodographs for every downloaded file (with all default settings),
+    spread over `workers` processes. Images will be saved in the plots/
+    subdirectory of the directory the data was downloaded into, and passed
+    to sink as they're written.
     """
-    wfo = nwswfos[radar_id]
-    fnames = glob("%s/K%s_SDUS*_NVW%s*" % (output_path, wfo, radar_id[1:]))
-
-    for f in fnames:
-        date_str = f[-12:]
-        dt = datetime.strptime(date_str, '%Y%m%d%H%M')
-        dt_str = datetime.strftime(dt, '%Y-%m-%d/%H%M')
-
-        if sfc_wind is not None:
-            arg = "python vad.py %s -t %s -s %s -m %s -p %s" % (radar_id,
-                                                                dt_str,
-                                                                sfc_wind,
-                                                                storm_motion,
-                                                                output_path)
-        else:
-            arg = "python vad.py %s -t %s -m %s -p %s" % (radar_id,
-                                                          dt_str,
-                                                          storm_motion,
-                                                          output_path)
-        os.system(arg)
-        arg = "mv %s_vad.png %s/plots/%s_%s_vad.png" % (radar_id,
-                                                        output_path,
-                                                        radar_id,
-                                                        date_str)
-        os.system(arg)
-
-def run_vwp(output_path, radar_id):
+    np.seterr(all='ignore')
+    vad_plotter_batch(radar_id, output_path, storm_motion=storm_motion,
+                      sfc_wind=sfc_wind, out_path=output_path + '/plots',
+                      workers=workers, sink=sink)
+
+def run_vwp(output_path, radar_id, sink=None):
     """
-    Automatically run the vwp.py script.
+    Plot the VWP for every downloaded file, as `vwp.py -p` would. It's done
+    in-process, so vwp.py's stage timings go into the run report. The image
+    is saved in the plots/ subdirectory and passed to sink.
     """
-    arg = "python vwp.py %s -p %s" % (radar_id, output_path)
-    os.system(arg)
+    fname = "%s/plots/%s_vwp.png" % (output_path, radar_id)
+    with runstats.span('run_vwp') as span:
+        try:
+            vwp_plotter(radar_id, fname=fname, local_path=output_path)
+        except Exception as exc:
+            # As before, a failed VWP doesn't stop the run
+            print("Could not plot the VWP: %s" % (exc))
+            traceback.print_exc()
+            span['error'] = str(exc)
+            return
 
-    arg = "mv %s_vwp.png %s/plots/%s_vwp.png" % (radar_id,
-                                                 output_path,
-                                                 radar_id)
-    os.system(arg)
+    if sink is not None and os.path.exists(fname):
+        sink(fname)
 
 def main():
     # Radar site. Checks for lowercase letters and whether this is a
@@ -233,50 +335,65 @@ def main():
     ##########################################################
     # End of user inputs
     ##########################################################
-    if archive_path == None:
-        files = find_files(radar_id, start_time, end_time, catalogue_base)
-        if len(files) > 0:
-            output_path = download_files(files, start_time, end_time, download_base)
-            inflate_files(radar_id, files, output_path)
-
-            if not os.path.exists(output_path + '/plots'):
-                os.mkdir(output_path + '/plots')
-
-            run_vad(output_path, radar_id, storm_motion, sfc_wind)
-            run_vwp(output_path, radar_id)
+    if RUN_REPORT or LOG_SPANS:
+        runstats.start_report('main', log=LOG_SPANS)
+
+    # The report is written however the run ends. Until there's an output
+    # directory to put it beside, it goes in the current directory.
+    report_path = "%s/%s" % (HOME_DIR, radar_id)
+    try:
+        if archive_path == None:
+            files = find_files(radar_id, start_time, end_time, catalogue_base)
+            if len(files) > 0:
+                output_path = download_files(files, start_time, end_time, download_base)
+                report_path = output_path
+
+                if not os.path.exists(output_path + '/plots'):
+                    os.mkdir(output_path + '/plots')
+
+                # Output goes into a zip as it's written, to allow download access
+                # from Jupyter
+                with ZipSink(output_path + '.zip', output_path, include_data=ZIP_DATA) as sink:
+                    inflate_files(radar_id, files, output_path, sink=sink)
+                    run_vad(output_path, radar_id, storm_motion, sfc_wind, sink=sink)
+                    run_vwp(output_path, radar_id, sink=sink)
+            else:
+                print("No archived VAD files found. Sorry...")
+
+        # If user has specified a directory containing archived .nids NVW files
+        elif archive_path != None:
+            archive_path = archive_path.strip(' ')
+            report_path = archive_path
+
+            if not os.path.exists(archive_path + '/plots'):
+                os.mkdir(archive_path + '/plots')
+
+            # For whatever reason, some of the SDUS headers seem to change. Quick fix
+            # seems to be just to rename these. Probably worth a peek inside just to make sure
+            # the data's good, however.
+            ncei_files = glob(archive_path + '/*SDUS*')
+            for f in ncei_files:
+                idx = f.index('K' + nwswfos[radar_id])
+                header = int(f[idx+9:idx+11])
+                if header != 34:
+                    new_f = f[0:idx+9] + "34" + f[idx+11:]
+                    print("Renaming : %s" % (f))
+                    shutil.move(f, new_f)
+
+            # Output goes into a zip as it's written, to allow easier download access.
+            with ZipSink(archive_path + '.zip', archive_path, include_data=ZIP_DATA) as sink:
+                for f in sorted(glob(archive_path + '/*SDUS*')):
+                    sink(f)
+                run_vad(archive_path, radar_id, storm_motion, sfc_wind, sink=sink)
+                run_vwp(archive_path, radar_id, sink=sink)
 
-            # Zip the new folder up to allow download access from Jupyter
-            #print("Creating zipped file %s with output" % (output_path))
-            shutil.make_archive(output_path, 'zip', output_path)
         else:
-            print("No archived VAD files found. Sorry...")
-
-    # If user has specified a directory containing archived .nids NVW files
-    elif archive_path != None:
-        archive_path = archive_path.strip(' ')
-
-        if not os.path.exists(archive_path + '/plots'):
-            os.mkdir(archive_path + '/plots')
-
-        # For whatever reason, some of the SDUS headers seem to change. Quick fix
-        # seems to be just to rename these. Probably worth a peek inside just to make sure
-        # the data's good, however.
-        ncei_files = glob(archive_path + '/*SDUS*')
-        for f in ncei_files:
-            idx = f.index('K' + nwswfos[radar_id])
-            header = int(f[idx+9:idx+11])
-            if header != 34:
-                new_f = f[0:idx+9] + "34" + f[idx+11:]
-                print("Renaming : %s" % (f))
-                shutil.move(f, new_f)
-
-        run_vad(archive_path, radar_id, storm_motion, sfc_wind)
-        run_vwp(archive_path, radar_id)
-
-        # Zip the new folder up to allow easier download access.
-        #print("Creating zipped file %s with output" % (archive_path))
-        shutil.make_archive(archive_path, 'zip', archive_path)
-
-    else:
-        print("Bad user inputs.")
+            print("Bad user inputs.")
+    except BaseException as exc:
+        runstats.fail(exc)
+        raise
+    finally:
+        report = runstats.stop_report()
+        if RUN_REPORT and report is not None:
+            report.write(report_path + '_report.json')
 if __name__ == "__main__": main()
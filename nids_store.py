@@ -0,0 +1,150 @@
+from __future__ import print_function
+
+import os
+import shutil
+import argparse
+import tempfile
+
+"""
+nids_store.py
+Persistent local store of the compressed .nids products downloaded from
+THREDDS, so re-running an event doesn't download the same files again. Each
+product lives at <store>/<radar>/<product>/<YYYYMMDD>/<YYYYMMDD_HHMM>.nids,
+so the key (radar, product, scan time) is the address. Reading a product
+marks it as recently used, and once the store grows past its size cap the
+least recently used products are removed.
+"""
+
+STORE_DIR = os.environ.get('VAD_STORE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'vad-archive-plots', 'nids'))
+STORE_MAX_MB = float(os.environ.get('VAD_STORE_MAX_MB', 2048))
+
+class NIDSStore(object):
+    def __init__(self, root=STORE_DIR, max_mb=STORE_MAX_MB):
+        self.root = root
+        self.max_bytes = int(max_mb * 1024 * 1024)
+
+    def path(self, radar_id, product, scan_time):
+        return os.path.join(self.root, radar_id.upper(), product.upper(), scan_time.strftime('%Y%m%d'),
+                            "%s.nids" % scan_time.strftime('%Y%m%d_%H%M'))
+
+    def _touch(self, path):
+        # The modification time doubles as the last-used time
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+
+    def get(self, radar_id, product, scan_time):
+        """
+        The stored product, or None if it isn't in the store.
+        """
+        path = self.path(radar_id, product, scan_time)
+        try:
+            with open(path, 'rb') as fnids:
+                data = fnids.read()
+        except (IOError, OSError):
+            return None
+
+        self._touch(path)
+        return data
+
+    def copy_to(self, radar_id, product, scan_time, dest):
+        """
+        Put the stored product at dest (hard-linked if possible). Returns False
+        if it isn't in the store.
+        """
+        path = self.path(radar_id, product, scan_time)
+        if not os.path.exists(path):
+            return False
+
+        try:
+            os.link(path, dest)
+        except OSError:
+            try:
+                shutil.copyfile(path, dest)
+            except (IOError, OSError):
+                return False
+
+        self._touch(path)
+        return True
+
+    def put(self, radar_id, product, scan_time, data, evict=True):
+        """
+        Add a product to the store. Pass evict=False when adding several, and
+        call evict() once at the end.
+        """
+        path = self.path(radar_id, product, scan_time)
+        store_dir = os.path.dirname(path)
+        if not os.path.exists(store_dir):
+            os.makedirs(store_dir)
+
+        # Write under a temporary name so a partial file is never picked up
+        fd, tmp_path = tempfile.mkstemp(dir=store_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as fnids:
+                fnids.write(data)
+            os.replace(tmp_path, path)
+        except (IOError, OSError):
+            os.remove(tmp_path)
+            raise
+
+        if evict:
+            self.evict()
+
+    def _entries(self):
+        entries = []
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            for filename in filenames:
+                if not filename.endswith('.nids'):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def size(self):
+        return sum(size for mtime, size, path in self._entries())
+
+    def evict(self, max_bytes=None):
+        """
+        Remove the least recently used products until the store is no bigger
+        than max_bytes (default: the store's cap). Returns the number removed.
+        """
+        if max_bytes is None:
+            max_bytes = self.max_bytes
+
+        entries = sorted(self._entries())
+        total = sum(size for mtime, size, path in entries)
+
+        num_removed = 0
+        for mtime, size, path in entries:
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            num_removed += 1
+        return num_removed
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('-d', '--store-dir', dest='store_dir', default=STORE_DIR, help="Location of the store. Defaults to %s." % STORE_DIR)
+    ap.add_argument('-m', '--max-mb', dest='max_mb', type=float, help="Evict least recently used files until the store is no bigger than this many MB.")
+    ap.add_argument('--clear', dest='clear', action='store_true', help="Remove everything from the store.")
+    args = ap.parse_args()
+
+    store = NIDSStore(args.store_dir)
+    if args.clear:
+        print("Removed %d files" % store.evict(0))
+    elif args.max_mb is not None:
+        print("Removed %d files" % store.evict(int(args.max_mb * 1024 * 1024)))
+    print("Store %s holds %.1f MB" % (store.root, store.size() / (1024. * 1024.)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+from __future__ import print_function
+
+import re
+import time
+import random
+import argparse
+import threading
+from datetime import datetime, timedelta
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from wsr88d import nexrads
+from synth_nvw import make_nvw
+
+"""
+nvw_server.py
+A local stand-in for the THREDDS and tgftp servers, for testing and timing the
+download pipeline offline. It serves synthetic NVW files (see synth_nvw.py)
+for one radar in the same layout as thredds.ucar.edu:
+
+    /thredds/[catalog/]<nexrad|terminal>/level3/NVW/<RID>/<YYYYMMDD>/catalog.html
+    /thredds/fileServer/<nexrad|terminal>/level3/NVW/<RID>/<YYYYMMDD>/Level3_<RID>_NVW_<YYYYMMDD>_<HHMM>.nids
+
+and as a tgftp directory listing at /SL.us008001/DF.of/DC.radar/DS.48vwp/SI.<rid>/.
+Each request can be delayed, and a fraction of them answered with an error,
+to see how the downloader copes with a slow or flaky server.
+"""
+
+_tgftp_path = "/SL.us008001/DF.of/DC.radar/DS.48vwp"
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type='application/octet-stream'):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server.nvw
+        status, body, content_type = server.respond(re.sub('/+', '/', self.path.split('?')[0]))
+        self._send(status, body, content_type)
+
+
+class NVWServer(object):
+    def __init__(self, radar_id='KLOT', start=datetime(2020, 5, 1, 12), num_scans=24, interval=5, num_levels=30, vcp=212,
+                 latency=0., jitter=0., error_rate=0., error_status=503, seed=0, host='127.0.0.1', port=0):
+        """
+        Serve num_scans scans for radar_id, interval minutes apart from start.
+        Every response is delayed by latency seconds (plus up to jitter more),
+        and error_rate of them get an error_status response instead. port=0
+        picks a free port; see the url attribute.
+        """
+        self.radar_id = radar_id
+        self.type_ = 'nexrad' if radar_id in nexrads else 'terminal'
+        self.times = [ start + timedelta(minutes=idx * interval) for idx in range(num_scans) ]
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+
+        self.num_requests = 0
+        self.num_errors = 0
+        self.bytes_sent = 0
+
+        # Made up front, so building them doesn't count against the requests
+        self._products = {}
+        for idx, scan_time in enumerate(self.times):
+            for compress in [True, False]:
+                self._products[idx, compress] = make_nvw(scan_time, radar_id=radar_id, vcp=vcp, num_levels=num_levels,
+                    seed=idx, compress=compress)
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread = None
+
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.nvw = self
+        self.url = "http://%s:%d" % self._httpd.server_address[:2]
+
+    @property
+    def thredds_base(self):
+        """
+        Use in place of main.base.
+        """
+        return "%s/thredds" % self.url
+
+    @property
+    def tgftp_base(self):
+        """
+        Use in place of vad_reader._base_url.
+        """
+        return self.url + _tgftp_path
+
+    def _thredds(self, path):
+        rid = self.radar_id[1:]
+        prefix = "%s/level3/NVW/%s/" % (self.type_, rid)
+
+        # main.py asks for the catalogues without the catalog/ component
+        match = re.match(r"/thredds/(catalog/)?" + re.escape(prefix) + r"(\d{8})/catalog\.html$", path)
+        if match:
+            names = [ "Level3_%s_NVW_%s" % (rid, t.strftime("%Y%m%d_%H%M")) for t in self.times if t.strftime("%Y%m%d") == match.group(2) ]
+            if len(names) == 0:
+                return 404, b"Not found", 'text/plain'
+            rows = "\n".join("<tr><td><a href='%s.nids'><tt>%s.nids</tt></a></td></tr>" % (name, name) for name in names)
+            html = "<html><body><table>\n%s\n</table></body></html>" % rows
+            return 200, html.encode('utf-8'), 'text/html'
+
+        match = re.match(r"/thredds/fileServer/" + re.escape(prefix) + r"(\d{8})/Level3_%s_NVW_(\d{8}_\d{4})\.nids$" % rid, path)
+        if match:
+            scan_time = datetime.strptime(match.group(2), "%Y%m%d_%H%M")
+            if scan_time in self.times and match.group(1) == match.group(2)[:8]:
+                return 200, self._products[self.times.index(scan_time), True], 'application/octet-stream'
+        return 404, b"Not found", 'text/plain'
+
+    def _tgftp(self, path):
+        # sn.NNNN files, oldest first; sn.last is the newest
+        directory = "%s/SI.%s/" % (_tgftp_path, self.radar_id.lower())
+        names = [ "sn.%04d" % idx for idx in range(len(self.times)) ]
+
+        if path == directory:
+            lines = [ "-rw-r--r--   1 ftp  ftp  %6d %s %s" % (len(self._products[idx, False]), t.strftime("%b %d %H:%M"), name)
+                      for idx, (name, t) in enumerate(zip(names, self.times)) ]
+            return 200, ("\n".join(lines) + "\n").encode('utf-8'), 'text/plain'
+
+        if path.startswith(directory):
+            name = path[len(directory):]
+            if name == 'sn.last':
+                name = names[-1]
+            if name in names:
+                return 200, self._products[names.index(name), False], 'application/octet-stream'
+        return 404, b"Not found", 'text/plain'
+
+    def respond(self, path):
+        """
+        (status, body, content type) for a request path.
+        """
+        with self._lock:
+            self.num_requests += 1
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            fail = self._random.random() < self.error_rate
+            if fail:
+                self.num_errors += 1
+
+        if delay > 0:
+            time.sleep(delay)
+
+        if fail:
+            response = self.error_status, b"Injected error", 'text/plain'
+        elif path.startswith('/thredds/'):
+            response = self._thredds(path)
+        else:
+            response = self._tgftp(path)
+
+        with self._lock:
+            self.bytes_sent += len(response[1])
+        return response
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('-r', '--radar-id', dest='radar_id', default='KLOT', help="Radar to serve files for. Defaults to KLOT.")
+    ap.add_argument('-t', '--start', dest='start', default='20200501/1200', help="Time of the first scan (YYYYMMDD/HHMM). Defaults to 20200501/1200.")
+    ap.add_argument('-n', '--num-scans', dest='num_scans', type=int, default=24, help="Number of scans to serve. Defaults to 24.")
+    ap.add_argument('-l', '--latency', dest='latency', type=float, default=0., help="Seconds to delay each response. Defaults to 0.")
+    ap.add_argument('-j', '--jitter', dest='jitter', type=float, default=0., help="Up to this many more seconds of random delay. Defaults to 0.")
+    ap.add_argument('-e', '--error-rate', dest='error_rate', type=float, default=0., help="Fraction of requests answered with an HTTP 503. Defaults to 0.")
+    ap.add_argument('-p', '--port', dest='port', type=int, default=8000, help="Port to listen on. Defaults to 8000.")
+    args = ap.parse_args()
+
+    server = NVWServer(args.radar_id.upper(), start=datetime.strptime(args.start, '%Y%m%d/%H%M'), num_scans=args.num_scans,
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, port=args.port)
+    print("Serving %s on %s (THREDDS base %s)" % (server.radar_id, server.url, server.thredds_base))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
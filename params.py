@@ -12,46 +12,232 @@ def comp2vec(u, v):
     vdir = np.where(vdir >= 360, vdir - 360, vdir)
     return vdir, vmag
 
+def _interp(x, xp, fp):
+    """
+    Same as np.interp(x, xp, fp, left=np.nan, right=np.nan), but along the last
+    axis of xp and fp, so a whole stack of profiles (padded at the top with NaN)
+    can be interpolated at once. x is broadcast against the leading axes of xp
+    and fp, with the interpolation points along its last axis.
+    """
+    x = np.asarray(x, dtype=float)
+    xp = np.asarray(xp, dtype=float)
+    fp = np.asarray(fp, dtype=float)
+
+    scalar = (x.ndim == 0)
+    x = np.atleast_1d(x)
+
+    # Index of the last sample point at or below each x. NaN padding never
+    # compares as <= x, so this also works for ragged profiles.
+    idx = np.sum(xp[..., np.newaxis, :] <= x[..., np.newaxis], axis=-1) - 1
+    num_pts = np.sum(~np.isnan(xp), axis=-1)[..., np.newaxis]
+
+    if xp.shape[-1] == 0:
+        result = np.nan * np.ones(idx.shape)
+    else:
+        idx_lo = np.clip(idx, 0, xp.shape[-1] - 1)
+        idx_hi = np.clip(idx + 1, 0, xp.shape[-1] - 1)
+        xp_lo, xp_hi = np.take_along_axis(xp, idx_lo, -1), np.take_along_axis(xp, idx_hi, -1)
+        fp_lo, fp_hi = np.take_along_axis(fp, idx_lo, -1), np.take_along_axis(fp, idx_hi, -1)
+
+        # Same arithmetic (and NaN fallbacks) as np.interp
+        with np.errstate(all='ignore'):
+            slope = (fp_hi - fp_lo) / (xp_hi - xp_lo)
+            result = slope * (x - xp_lo) + fp_lo
+            result = np.where(np.isnan(result), slope * (x - xp_hi) + fp_hi, result)
+        result = np.where(np.isnan(result) & (fp_lo == fp_hi), fp_lo, result)
+        result = np.where(x == xp_lo, fp_lo, result)
+
+        valid = (idx >= 0) & ((idx < num_pts - 1) | (x == xp_lo))
+        result = np.where(valid, result, np.nan)
+
+    if scalar:
+        result = result[..., 0]
+    return result
+
 def interp(u, v, altitude, hght):
     u_hght = np.interp(hght, altitude, u, left=np.nan, right=np.nan)
     v_hght = np.interp(hght, altitude, v, left=np.nan, right=np.nan)
     return u_hght, v_hght
 
 
-def _clip_profile(prof, alt, clip_alt, intrp_prof):
-    try:
-        idx_clip = np.where((alt[:-1] <= clip_alt) & (alt[1:] > clip_alt))[0][0]
-    except IndexError:
-        return np.nan * np.ones(prof.size)
-
-    prof_clip = prof[:(idx_clip + 1)]
-    prof_clip = np.append(prof_clip, intrp_prof)
-
-    return np.array(prof_clip)
-
-
+def _clip_index(alt, hght):
+    """
+    Index of the last level at or below hght in each (NaN-padded) profile, and
+    whether hght falls strictly inside the profile so that it can be clipped
+    there.
+    """
+    idx = np.sum(alt <= hght, axis=-1) - 1
+    num_pts = np.sum(~np.isnan(alt), axis=-1)
+    return idx, (idx >= 0) & (idx < num_pts - 1)
+
+def _take(prof, idx):
+    idx = np.clip(idx, 0, prof.shape[-1] - 1)
+    return np.take_along_axis(prof, idx[..., np.newaxis], -1)[..., 0]
+
+
+class WindProfile(object):
+    """
+    u and v components of a wind profile, along with anything derived from
+    them (storm-relative winds, winds interpolated to given heights, running
+    helicity integrals), computed on first use and then kept. data is anything
+    that can be indexed by 'wind_dir', 'wind_spd' and 'altitude'. Don't hold on
+    to one across changes to the data; VADFile.wind hands out a new one after
+    add_surface_wind.
+    """
+    __slots__ = ['wind_dir', 'wind_spd', 'altitude', '_u', '_v', '_interp', '_storm_relative', '_helicity']
+
+    def __init__(self, data):
+        self.wind_dir = data['wind_dir']
+        self.wind_spd = data['wind_spd']
+        self.altitude = data['altitude']
+        self._u = None
+        self._v = None
+        self._interp = {}
+        self._storm_relative = None
+        self._helicity = None
+
+    def _components(self):
+        if self._u is None:
+            self._u, self._v = vec2comp(self.wind_dir, self.wind_spd)
+        return self._u, self._v
+
+    @property
+    def u(self):
+        return self._components()[0]
+
+    @property
+    def v(self):
+        return self._components()[1]
+
+    def interp(self, hght):
+        """
+        u and v interpolated to hght (km), NaN outside of the profile.
+        """
+        key = (np.ndim(hght), tuple(np.ravel(hght).tolist()))
+        if key not in self._interp:
+            u, v = self._components()
+            self._interp[key] = (_interp(hght, self.altitude, u), _interp(hght, self.altitude, v))
+        return self._interp[key]
+
+    def storm_relative(self, storm_motion):
+        """
+        Storm-relative u and v for a storm motion given as (direction, speed).
+        Only the most recent storm motion is kept.
+        """
+        storm_u, storm_v = vec2comp(*storm_motion)
+        storm_u, storm_v = np.asarray(storm_u)[..., np.newaxis], np.asarray(storm_v)[..., np.newaxis]
+
+        cached = self._storm_relative
+        if cached is None or not (np.array_equal(cached[0], storm_u) and np.array_equal(cached[1], storm_v)):
+            u, v = self._components()
+            self._storm_relative = (storm_u, storm_v, u - storm_u, v - storm_v)
+            self._helicity = None
+        return self._storm_relative[2:]
+
+    def _helicity_to(self, storm_motion, hght):
+        sru, srv = self.storm_relative(storm_motion)
+        if self._helicity is None:
+            # Storm-relative winds in m/s and the running sum of the helicity
+            # of each layer between levels, from the lowest level up.
+            sru = sru / 1.94
+            srv = srv / 1.94
+            layers = np.cumsum((sru[..., 1:] * srv[..., :-1]) - (sru[..., :-1] * srv[..., 1:]), axis=-1)
+            self._helicity = (sru, srv, layers)
+        sru, srv, layers = self._helicity
+
+        sru_hght, srv_hght = _interp(hght, self.altitude, sru), _interp(hght, self.altitude, srv)
+        idx, valid = _clip_index(self.altitude, hght)
+
+        # Full layers below the level at or below hght, then the partial layer
+        # up to hght itself.
+        srh = (sru_hght * _take(srv, idx)) - (_take(sru, idx) * srv_hght)
+        srh = np.where(idx > 0, _take(layers, idx - 1) + srh, srh)
+        return np.where(valid, srh, np.nan)
+
+    def helicity(self, storm_motion, bottom, top):
+        """
+        Storm-relative helicity (m^2/s^2) in the layer from bottom to top (km)
+        for a storm motion given as (direction, speed). A bottom of None, or
+        at or below the lowest level, starts the layer at the lowest level. The
+        running integral is kept, so each new layer only costs two lookups.
+        """
+        if self.altitude.shape[-1] < 2:
+            return np.nan * np.ones(self.altitude.shape[:-1])
+
+        if bottom is None:
+            srh_bottom = 0.
+        else:
+            srh_bottom = np.where(bottom <= self.altitude[..., 0], 0., self._helicity_to(storm_motion, bottom))
+        return self._helicity_to(storm_motion, top) - srh_bottom
+
+    def shear(self, bottom, top):
+        """
+        Magnitude of the bulk shear (kts) between bottom and top (km). A bottom
+        of None, or at or below the lowest level, uses the lowest level.
+        """
+        u_bot, v_bot, u_top, v_top = self._layer_winds(bottom, top)
+        return np.hypot(u_top - u_bot, v_top - v_bot)
+
+    def _layer_winds(self, bottom, top):
+        u, v = self._components()
+        u_top, v_top = self.interp(top)
+        if bottom is None:
+            return u[..., 0], v[..., 0], u_top, v_top
+
+        u_bot, v_bot = self.interp(bottom)
+
+        at_lowest = bottom <= self.altitude[..., 0]
+        u_bot = np.where(at_lowest, u[..., 0], u_bot)
+        v_bot = np.where(at_lowest, v[..., 0], v_bot)
+        return u_bot, v_bot, u_top, v_top
+
+
+def wind_profile(data):
+    """
+    The WindProfile for data. VADFiles keep theirs, so derived quantities are
+    shared by everything that uses the same file.
+    """
+    if isinstance(data, WindProfile):
+        return data
+    elif hasattr(data, 'wind'):
+        return data.wind
+    return WindProfile(data)
+
+
+# All of the compute_* functions work along the last axis, so data can hold
+# either a single profile or a stack of profiles padded at the top with NaN.
+# Sums are accumulated level-by-level with cumsum so that a profile gives
+# exactly the same result whether it's on its own or in a stack.
+
+# The fixed 0-1, 0-3 and 0-6 km layers start at the lowest level, even if
+# that's below the radar (e.g. a surface wind at a lower site).
 def compute_shear_mag(data, hght):
-    u, v = vec2comp(data['wind_dir'], data['wind_spd'])
-    u_hght, v_hght = interp(u, v, data['altitude'], hght)
-    return np.hypot(u_hght - u[0], v_hght - v[0])
+    return wind_profile(data).shear(None, hght)
 
 
 def compute_srh(data, storm_motion, hght):
-    u, v = vec2comp(data['wind_dir'], data['wind_spd'])
-    if len(u) < 2 and len(v) < 2:
-        return np.nan
-
-    storm_u, storm_v = vec2comp(*storm_motion)
-
-    sru = (u - storm_u) / 1.94
-    srv = (v - storm_v) / 1.94
-
-    sru_hght, srv_hght = interp(sru, srv, data['altitude'], hght)
-    sru_clip = _clip_profile(sru, data['altitude'], hght, sru_hght)
-    srv_clip = _clip_profile(srv, data['altitude'], hght, srv_hght)
-
-    layers = (sru_clip[1:] * srv_clip[:-1]) - (sru_clip[:-1] * srv_clip[1:])
-    return layers.sum()
+    return wind_profile(data).helicity(storm_motion, None, hght)
+
+
+def compute_srh_sweep(data, storm_u, storm_v, hghts=(1, 3)):
+    """
+    0-1 and 0-3 km (or any other depths in hghts) SRH of a single profile for
+    a whole grid of storm motions. storm_u and storm_v are the storm motion
+    components (kts) and are broadcast against each other. Returns a dict of
+    arrays keyed like compute_parameters (srh_1km, srh_3km).
+    """
+    prof = wind_profile(data)
+    storm_u = np.asarray(storm_u) / 1.94
+    storm_v = np.asarray(storm_v) / 1.94
+
+    # SRH is linear in the storm motion: the ground-relative helicity of the
+    # layer, plus terms from the change in wind across the layer.
+    sweep = {}
+    for hght in hghts:
+        srh = prof.helicity((0, 0), None, hght)
+        u_bot, v_bot, u_top, v_top = prof._layer_winds(None, hght)
+        sweep["srh_%dkm" % hght] = srh + storm_u * (v_top - v_bot) / 1.94 - storm_v * (u_top - u_bot) / 1.94
+    return sweep
 
 
 def compute_bunkers(data):
@@ -59,17 +245,17 @@ def compute_bunkers(data):
     hght = 6
                 
     # SFC-6km Mean Wind
-    u, v = vec2comp(data['wind_dir'], data['wind_spd'])
-    u_hght, v_hght = interp(u, v, data['altitude'], hght)
-    u_clip = _clip_profile(u, data['altitude'], hght, u_hght)
-    v_clip = _clip_profile(v, data['altitude'], hght, v_hght)
+    prof = wind_profile(data)
+    u, v = prof.u, prof.v
+    u_hght, v_hght = prof.interp(hght)
+    idx, valid = _clip_index(prof.altitude, hght)
 
-    mnu6 = u_clip.mean()
-    mnv6 = v_clip.mean()
+    mnu6 = np.where(valid, (_take(np.cumsum(u, axis=-1), idx) + u_hght) / (idx + 2), np.nan)
+    mnv6 = np.where(valid, (_take(np.cumsum(v, axis=-1), idx) + v_hght) / (idx + 2), np.nan)
 
     # SFC-6km Shear Vector
-    shru = u_hght - u[0]
-    shrv = v_hght - v[0]
+    shru = u_hght - u[..., 0]
+    shrv = v_hght - v[..., 0]
 
     # Bunkers Right Motion
     tmp = d / np.hypot(shru, shrv)
@@ -82,16 +268,17 @@ def compute_bunkers(data):
     
 
 def compute_crit_angl(data, storm_motion):
-    u, v = vec2comp(data['wind_dir'], data['wind_spd'])
+    prof = wind_profile(data)
+    u, v = prof.u, prof.v
     storm_u, storm_v = vec2comp(*storm_motion)
 
-    u_05km, v_05km = interp(u, v, data['altitude'], 0.5)
+    u_05km, v_05km = prof.interp(0.5)
 
-    base_u = storm_u - u[0]
-    base_v = storm_v - v[0]
+    base_u = storm_u - u[..., 0]
+    base_v = storm_v - v[..., 0]
 
-    ang_u = u_05km - u[0]
-    ang_v = v_05km - v[0]
+    ang_u = u_05km - u[..., 0]
+    ang_v = v_05km - v[..., 0]
 
     len_base = np.hypot(base_u, base_v)
     len_ang = np.hypot(ang_u, ang_v)
@@ -100,7 +287,13 @@ def compute_crit_angl(data, storm_motion):
     return np.degrees(np.arccos(base_dot_ang / (len_base * len_ang)))
 
 
-def compute_parameters(data, storm_motion):
+def compute_parameters(data, storm_motion, layers=()):
+    """
+    Compute the hodograph parameters for a profile. layers is an optional list
+    of extra (bottom, top) layers (km) to compute SRH and bulk shear for, added
+    as e.g. srh_1-3km and shear_mag_1-3km.
+    """
+    data = wind_profile(data)
     params = {}
 
     try:
@@ -133,5 +326,33 @@ def compute_parameters(data, storm_motion):
     for hght in [1, 3]:
         params["srh_%dkm" % hght] = compute_srh(data, params['storm_motion'], hght)
 
+    for bottom, top in layers:
+        layer = "%g-%gkm" % (bottom, top)
+        params["srh_" + layer] = data.helicity(params['storm_motion'], bottom, top)
+        try:
+            params["shear_mag_" + layer] = data.shear(bottom, top)
+        except (IndexError, ValueError):
+            params["shear_mag_" + layer] = np.nan
+
     return params
 
+
+
+def compute_parameters_batch(data, storm_motion, layers=()):
+    """
+    compute_parameters for a whole time series at once. data holds time x level
+    stacks of wind_dir, wind_spd and altitude (e.g. a VWPCube), either masked
+    or padded at the top with NaN. Every parameter comes back as an array over
+    time, identical to what compute_parameters gives for each profile alone.
+    """
+    stack = {}
+    for key in ['wind_dir', 'wind_spd', 'altitude']:
+        stack[key] = np.ma.filled(np.ma.asarray(data[key], dtype=float), np.nan)
+        if stack[key].shape[-1] == 0:
+            stack[key] = np.nan * np.ones(stack[key].shape[:-1] + (1,))
+
+    params = compute_parameters(WindProfile(stack), storm_motion, layers=layers)
+
+    shape = stack['altitude'].shape[:-1]
+    params['storm_motion'] = tuple(np.broadcast_to(val, shape) for val in params['storm_motion'])
+    return params
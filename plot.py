@@ -4,16 +4,23 @@ import numpy as np
 
 import matplotlib as mpl
 mpl.use('agg')
+import matplotlib.animation
+import matplotlib.image
 import pylab
 from matplotlib.patches import Circle, Rectangle
 from matplotlib.lines import Line2D
 from matplotlib.colors import ListedColormap
+from matplotlib.collections import EllipseCollection, LineCollection, PathCollection
+from matplotlib.font_manager import FontProperties
+from matplotlib.textpath import TextPath, text_to_path
+from matplotlib.transforms import Affine2D
 from mpl_toolkits.axes_grid1.inset_locator import inset_axes
 
 import json
 from datetime import datetime, timedelta
 
-from params import vec2comp
+from params import vec2comp, wind_profile, compute_srh_sweep
+from vad_reader import VWPCube
 
 _seg_hghts = [0, 3, 6, 9, 12, 18] 
 _seg_colors = ['r', '#00ff00', '#008800', '#993399', 'c']
@@ -27,6 +34,9 @@ _alt_labs = np.arange(1, max_alt, 1)
 km2kft = 3.28084
 _alt_labs_kft = np.arange(5, max_alt*km2kft, 5)
 _bad_rms = 10.
+_label_font = FontProperties(size=9)
+_marker_font = FontProperties(size=6.5, weight='bold')
+_label_paths = {}
 
 def roundup(x):
     """Round to the nearest 10s"""
@@ -54,8 +64,33 @@ def _fmt_timedelta(td):
     return " ".join(strings)
 
 
+def _param_table_values(parameters, web=False):
+    # The values in the parameter table, from top to bottom
+    vals = []
+    for key in ['shear_mag_1km', 'srh_1km', 'shear_mag_3km', 'srh_3km', 'shear_mag_6km']:
+        vals.append("--" if np.isnan(parameters[key]) else "%d" % int(parameters[key]))
+
+    for key in ['storm_motion', 'bunkers_left', 'bunkers_right', 'mean_wind']:
+        vec_dir, vec_spd = parameters[key]
+        vals.append("--" if np.isnan(parameters[key]).any() else "%03d/%02d kts" % (vec_dir, vec_spd))
+
+    if np.isnan(parameters['critical']):
+        vals.append("--")
+    elif not web:
+        vals.append("%d$^{\circ}$" % int(parameters['critical']))
+    else:
+        vals.append("%d deg" % int(parameters['critical']))
+    return vals
+
+
 def _plot_param_table(parameters, web=False):
-    storm_dir, storm_spd = parameters['storm_motion']
+    """
+    Draw the parameter table. Returns the Text artists holding the values, in
+    the same order as _param_table_values.
+    """
+    vals = iter(_param_table_values(parameters, web=web))
+    val_texts = []
+
     trans = pylab.gca().transAxes
     line_space = 0.033
     start_x = 1.02
@@ -82,59 +117,45 @@ def _plot_param_table(parameters, web=False):
     line_y -= line_space
 
     pylab.text(start_x, line_y, "0-1 km", fontweight='bold', **kwargs)
-    val = "--" if np.isnan(parameters['shear_mag_1km']) else "%d" % int(parameters['shear_mag_1km'])
-    pylab.text(start_x + 0.095, line_y, val, **kwargs)
-    val = "--" if np.isnan(parameters['srh_1km']) else "%d" % int(parameters['srh_1km'])
-    pylab.text(start_x + 0.22,  line_y, val, **kwargs)
+    val_texts.append(pylab.text(start_x + 0.095, line_y, next(vals), **kwargs))
+    val_texts.append(pylab.text(start_x + 0.22,  line_y, next(vals), **kwargs))
 
     line_y -= line_space
 
     pylab.text(start_x, line_y, "0-3 km", fontweight='bold', **kwargs)
-    val = "--" if np.isnan(parameters['shear_mag_3km']) else "%d" % int(parameters['shear_mag_3km'])
-    pylab.text(start_x + 0.095, line_y, val, **kwargs)
-    val = "--" if np.isnan(parameters['srh_3km']) else "%d" % int(parameters['srh_3km'])
-    pylab.text(start_x + 0.22,  line_y, val, **kwargs)
+    val_texts.append(pylab.text(start_x + 0.095, line_y, next(vals), **kwargs))
+    val_texts.append(pylab.text(start_x + 0.22,  line_y, next(vals), **kwargs))
 
     line_y -= line_space
 
     pylab.text(start_x, line_y, "0-6 km", fontweight='bold', **kwargs)
-    val = "--" if np.isnan(parameters['shear_mag_6km']) else "%d" % int(parameters['shear_mag_6km'])
-    pylab.text(start_x + 0.095, line_y, val, **kwargs)
+    val_texts.append(pylab.text(start_x + 0.095, line_y, next(vals), **kwargs))
 
     spacer = Line2D([start_x, start_x + 0.361], [line_y - line_space * 0.48] * 2, color='k', linestyle='-', transform=trans, clip_on=False)
     pylab.gca().add_line(spacer)
     line_y -= 1.5 * line_space
 
     pylab.text(start_x, line_y, "Storm Motion:", fontweight='bold', **kwargs)
-    val = "--" if np.isnan(parameters['storm_motion']).any() else "%03d/%02d kts" % (storm_dir, storm_spd)
-    pylab.text(start_x + 0.26, line_y + 0.001, val, **kwargs)
+    val_texts.append(pylab.text(start_x + 0.26, line_y + 0.001, next(vals), **kwargs))
 
     line_y -= line_space
 
-    bl_dir, bl_spd = parameters['bunkers_left']
     pylab.text(start_x, line_y, "Bunkers Left Mover:", fontweight='bold', **kwargs)
-    val = "--" if np.isnan(parameters['bunkers_left']).any() else "%03d/%02d kts" % (bl_dir, bl_spd)
-    pylab.text(start_x + 0.26, line_y + 0.001, val, **kwargs)
+    val_texts.append(pylab.text(start_x + 0.26, line_y + 0.001, next(vals), **kwargs))
 
     line_y -= line_space
 
-    br_dir, br_spd = parameters['bunkers_right']
     if not web:
         pylab.text(start_x, line_y, "Bunkers Right Mover:", fontweight='bold', **kwargs)
+        val_texts.append(pylab.text(start_x + 0.26, line_y + 0.001, next(vals), **kwargs))
     else:
         pylab.text(start_x, line_y - 0.005, "Bunkers Right Mover:", fontweight='bold', **kwargs)
-    val = "--" if np.isnan(parameters['bunkers_right']).any() else "%03d/%02d kts" % (br_dir, br_spd)
-    if not web:
-        pylab.text(start_x + 0.26, line_y + 0.001, val, **kwargs)
-    else:
-        pylab.text(start_x + 0.26, line_y - 0.001, val, **kwargs)
+        val_texts.append(pylab.text(start_x + 0.26, line_y - 0.001, next(vals), **kwargs))
 
     line_y -= line_space
 
-    mn_dir, mn_spd = parameters['mean_wind']
     pylab.text(start_x, line_y, "0-6 km Mean Wind:", fontweight='bold', **kwargs)
-    val = "--" if np.isnan(parameters['mean_wind']).any() else "%03d/%02d kts" % (mn_dir, mn_spd)
-    pylab.text(start_x + 0.26, line_y + 0.001, val, **kwargs)
+    val_texts.append(pylab.text(start_x + 0.26, line_y + 0.001, next(vals), **kwargs))
 
     spacer = Line2D([start_x, start_x + 0.361], [line_y - line_space * 0.48] * 2, color='k', linestyle='-', transform=trans, clip_on=False)
     pylab.gca().add_line(spacer)
@@ -142,12 +163,11 @@ def _plot_param_table(parameters, web=False):
 
     if not web:
         pylab.text(start_x, line_y, "Critical Angle:", fontweight='bold', **kwargs)
-        val = "--" if np.isnan(parameters['critical']) else "%d$^{\circ}$" % int(parameters['critical'])
-        pylab.text(start_x + 0.18, line_y - 0.0025, val, **kwargs)
+        val_texts.append(pylab.text(start_x + 0.18, line_y - 0.0025, next(vals), **kwargs))
     else:
         pylab.text(start_x, line_y - 0.0075, "Critical Angle:", fontweight='bold', **kwargs)
-        val = "--" if np.isnan(parameters['critical']) else "%d deg" % int(parameters['critical'])
-        pylab.text(start_x + 0.18, line_y - 0.0075, val, **kwargs)
+        val_texts.append(pylab.text(start_x + 0.18, line_y - 0.0075, next(vals), **kwargs))
+    return val_texts
 
 
 def _plot_data(data, parameters):
@@ -156,8 +176,9 @@ def _plot_data(data, parameters):
     br_dir, br_spd = parameters['bunkers_right']
     mn_dir, mn_spd = parameters['mean_wind']
 
-    u, v = vec2comp(data['wind_dir'], data['wind_spd'])
-    alt = data['altitude']
+    prof = wind_profile(data)
+    u, v = prof.u, prof.v
+    alt = prof.altitude
 
     storm_u, storm_v = vec2comp(storm_dir, storm_spd)
     bl_u, bl_v = vec2comp(bl_dir, bl_spd)
@@ -165,47 +186,59 @@ def _plot_data(data, parameters):
     mn_u, mn_v = vec2comp(mn_dir, mn_spd)
 
     seg_idxs = np.searchsorted(alt, _seg_hghts)
-    try:
-        seg_u = np.interp(_seg_hghts, alt, u, left=np.nan, right=np.nan)
-        seg_v = np.interp(_seg_hghts, alt, v, left=np.nan, right=np.nan)
-        ca_u = np.interp(0.5, alt, u, left=np.nan, right=np.nan)
-        ca_v = np.interp(0.5, alt, v, left=np.nan, right=np.nan)
-    except ValueError:
-        seg_u = np.nan * np.array(_seg_hghts)
-        seg_v = np.nan * np.array(_seg_hghts)
-        ca_u = np.nan
-        ca_v = np.nan
+    seg_u, seg_v = prof.interp(_seg_hghts)
+    ca_u, ca_v = prof.interp(0.5)
 
     mkr_z = np.arange(16)
-    mkr_u = np.interp(mkr_z, alt, u, left=np.nan, right=np.nan)
-    mkr_v = np.interp(mkr_z, alt, v, left=np.nan, right=np.nan)
+    mkr_u, mkr_v = prof.interp(mkr_z)
 
+    # All the segments in one pair of line collections (solid and dashed) and
+    # the RMS error circles in one ellipse collection.
+    solid, solid_colors = [], []
+    dashed, dashed_colors = [], []
+    rms_idxs, rms_colors = [], []
     for idx in range(len(_seg_hghts) - 1):
         idx_start = seg_idxs[idx]
         idx_end = seg_idxs[idx + 1]
+        color = _seg_colors[idx]
 
         if not np.isnan(seg_u[idx]):
-            pylab.plot([seg_u[idx], u[idx_start]], [seg_v[idx], v[idx_start]], '-', color=_seg_colors[idx], linewidth=1.5)
+            solid.append([(seg_u[idx], seg_v[idx]), (u[idx_start], v[idx_start])])
+            solid_colors.append(color)
 
         if idx_start < len(data['rms_error']) and data['rms_error'][idx_start] == 0.:
             # The first segment is to the surface wind, draw it in a dashed line
-            pylab.plot(u[idx_start:(idx_start + 2)], v[idx_start:(idx_start + 2)], '--', color=_seg_colors[idx], linewidth=1.5)
-            pylab.plot(u[(idx_start + 1):idx_end], v[(idx_start + 1):idx_end], '-', color=_seg_colors[idx], linewidth=1.5)
+            dashed.append(np.column_stack((u[idx_start:(idx_start + 2)], v[idx_start:(idx_start + 2)])))
+            dashed_colors.append(color)
+            solid.append(np.column_stack((u[(idx_start + 1):idx_end], v[(idx_start + 1):idx_end])))
         else:
-            pylab.plot(u[idx_start:idx_end], v[idx_start:idx_end], '-', color=_seg_colors[idx], linewidth=1.5)
+            solid.append(np.column_stack((u[idx_start:idx_end], v[idx_start:idx_end])))
+        solid_colors.append(color)
 
         if not np.isnan(seg_u[idx + 1]):
-            pylab.plot([u[idx_end - 1], seg_u[idx + 1]], [v[idx_end - 1], seg_v[idx + 1]], '-', color=_seg_colors[idx], linewidth=1.5)
+            solid.append([(u[idx_end - 1], v[idx_end - 1]), (seg_u[idx + 1], seg_v[idx + 1])])
+            solid_colors.append(color)
+
+        seg_rms = range(len(u))[idx_start:idx_end]
+        rms_idxs.extend(seg_rms)
+        rms_colors.extend([color] * len(seg_rms))
 
-        for upt, vpt, rms in list(zip(u, v, data['rms_error']))[idx_start:idx_end]:
-            rad = np.sqrt(2) * rms
-            circ = Circle((upt, vpt), rad, color=_seg_colors[idx], alpha=0.05)
-            pylab.gca().add_patch(circ)
+    ax = pylab.gca()
+    ax.add_collection(LineCollection(solid, colors=solid_colors, linewidths=1.5, capstyle='projecting', joinstyle='round', zorder=2), autolim=False)
+    if len(dashed) > 0:
+        ax.add_collection(LineCollection(dashed, colors=dashed_colors, linewidths=1.5, linestyles='--', joinstyle='round', zorder=2), autolim=False)
+
+    rms_idxs = np.array(rms_idxs, dtype=int)
+    rms_diam = 2 * np.sqrt(2) * np.asarray(data['rms_error'])[rms_idxs]
+    rms_colors = [ mpl.colors.to_rgba(color, alpha=0.05) for color in rms_colors ]
+    ax.add_collection(EllipseCollection(rms_diam, rms_diam, 0., units='xy', offsets=np.column_stack((u[rms_idxs], v[rms_idxs])),
+        offset_transform=ax.transData, facecolors=rms_colors, edgecolors=rms_colors, linewidths=1., zorder=1), autolim=False)
 
     pylab.plot(mkr_u, mkr_v, 'ko', ms=10)
-    for um, vm, zm in zip(mkr_u, mkr_v, mkr_z):
-        if not np.isnan(um):
-            pylab.text(um, vm - 0.1, str(zm), va='center', ha='center', color='white', size=6.5, fontweight='bold')
+    has_mkr = ~np.isnan(mkr_u)
+    mkr_paths = [ _text_path(str(zm), _marker_font, centered=True) for zm in mkr_z[has_mkr] ]
+    ax.add_collection(PathCollection(mkr_paths, offsets=np.column_stack((mkr_u[has_mkr], mkr_v[has_mkr] - 0.1)), offset_transform=ax.transData,
+        transform=Affine2D().scale(1 / 72.) + ax.figure.dpi_scale_trans, facecolors='white', edgecolors='none', zorder=3), autolim=False)
 
     try:
         pylab.plot([storm_u, u[0]], [storm_v, v[0]], 'c-', linewidth=0.75)
@@ -255,16 +288,25 @@ def _plot_background(min_u, max_u, min_v, max_v):
             pylab.text(irng + 0.5, -0.5, rng_str, ha='left', va='top', fontsize=9, color='#999999', clip_on=True, clip_box=pylab.gca().get_clip_box())
 
 
-def plot_hodograph(data, parameters, fname=None, web=False, fixed=False, archive=False):
-    img_title = "%s VWP valid %s" % (data.rid, data['time'].strftime("%d %b %Y %H%M UTC"))
-    if fname is not None:
-        img_file_name = fname
-    else:
-        img_file_name = "%s_vad.png" % data.rid
+def _plot_srh_sweep(data, hght, min_u, max_u, min_v, max_v):
+    # Contour the SRH each storm motion in the frame would have
+    storm_u, storm_v = np.meshgrid(np.linspace(min_u, max_u, 121), np.linspace(min_v, max_v, 121))
+    srh = compute_srh_sweep(data, storm_u, storm_v, hghts=[hght])["srh_%dkm" % hght]
+    if np.isnan(srh).all():
+        return
 
-    u, v = vec2comp(data['wind_dir'], data['wind_spd'])
+    levs = np.arange(-1000, 1001, 100)
+    cs = pylab.contour(storm_u, storm_v, srh, levels=levs[levs != 0], colors='#7f7f7f', linewidths=0.75, alpha=0.6)
+    pylab.clabel(cs, fmt="%d", fontsize=7)
+    pylab.text(0.99, 0.01, "Contours: 0-%d km SRH (m$^2$/s$^2$) by storm motion" % hght, transform=pylab.gca().transAxes,
+        ha='right', va='bottom', fontsize=8, color='#7f7f7f')
+
+
+def _hodo_bounds(data, fixed):
+    # The u and v limits of the hodograph frame
+    prof = wind_profile(data)
+    u, v = prof.u, prof.v
 
-    sat_age = 6 * 3600
     if fixed or len(u) == 0:
         ctr_u, ctr_v = 20, 20
         size = 120
@@ -278,11 +320,23 @@ def plot_hodograph(data, parameters, fname=None, web=False, fixed=False, archive
     max_u = ctr_u + size / 2
     min_v = ctr_v - size / 2
     max_v = ctr_v + size / 2
+    return min_u, max_u, min_v, max_v
+
+
+def plot_hodograph(data, parameters, fname=None, web=False, fixed=False, archive=False, srh_sweep=None):
+    img_title = "%s VWP valid %s" % (data.rid, data['time'].strftime("%d %b %Y %H%M UTC"))
+    if fname is not None:
+        img_file_name = fname
+    else:
+        img_file_name = "%s_vad.png" % data.rid
+
+    sat_age = 6 * 3600
+    min_u, max_u, min_v, max_v = _hodo_bounds(data, fixed)
 
     now = datetime.utcnow()
     img_age = now - data['time']
     age_cstop = min(_total_seconds(img_age) / sat_age, 1) * 0.4
-    age_color = mpl.cm.get_cmap('hot')(age_cstop)[:-1]
+    age_color = mpl.colormaps['hot'](age_cstop)[:-1]
 
     age_str = "Image created on %s (%s old)" % (now.strftime("%d %b %Y %H%M UTC"), _fmt_timedelta(img_age))
 
@@ -297,6 +351,8 @@ def plot_hodograph(data, parameters, fname=None, web=False, fixed=False, archive
     pylab.axes((axes_left, axes_bot, axes_wid, axes_hght))
 
     _plot_background(min_u, max_u, min_v, max_v)
+    if srh_sweep is not None:
+        _plot_srh_sweep(data, srh_sweep, min_u, max_u, min_v, max_v)
     _plot_data(data, parameters)
     _plot_param_table(parameters, web=web)
 
@@ -322,19 +378,145 @@ def plot_hodograph(data, parameters, fname=None, web=False, fixed=False, archive
         bounds = {'min_u':min_u, 'max_u':max_u, 'min_v':min_v, 'max_v':max_v}
         print(json.dumps(bounds)) 
 
+def _new_artists(ax, draw, *args):
+    # Run draw(*args) and return whatever it added to ax
+    before = set(ax.get_children())
+    draw(*args)
+    return [ artist for artist in ax.get_children() if artist not in before ]
+
+
+class HodographRenderer(object):
+    """
+    A hodograph figure that's reused for a whole series of profiles. The
+    figure, the parameter table labels and (while the frame doesn't move) the
+    range rings are only made once; each profile just replaces the data and the
+    table values. With a fixed frame, the rendered background is cached as
+    well, and each image is made by restoring it and drawing the data on top.
+    """
+    def __init__(self, web=False, fixed=False, archive=False):
+        self.web = web
+        self.fixed = fixed
+        self.archive = archive
+
+        self._fig = pylab.figure(figsize=(10, 7.5), dpi=150)
+        fig_wid, fig_hght = self._fig.get_size_inches()
+        fig_aspect = fig_wid / fig_hght
+
+        axes_left = 0.05
+        axes_bot = 0.05
+        axes_hght = 0.9
+        axes_wid = axes_hght / fig_aspect
+        self._ax = pylab.axes((axes_left, axes_bot, axes_wid, axes_hght))
+        pylab.xticks([])
+        pylab.yticks([])
+
+        self._frame = None
+        self._frame_artists = []
+        self._data_artists = []
+        self._table_texts = None
+        self._title = pylab.title("")
+        self._age = pylab.text(0., -0.01, "", transform=self._ax.transAxes, ha='left', va='top', fontsize=9)
+        self._background = None
+
+        if web:
+            web_brand = "http://www.autumnsky.us/vad/"
+            pylab.text(1.0, -0.01, web_brand, transform=self._ax.transAxes, ha='right', va='top', fontsize=9)
+
+    def _dynamic_artists(self):
+        return self._data_artists + self._table_texts + [self._title, self._age]
+
+    def render(self, data, parameters, fname, srh_sweep=None):
+        """
+        Plot the hodograph for data and save it to fname.
+        """
+        self.draw(data, parameters, srh_sweep=srh_sweep)
+        self._save(fname)
+
+    def draw(self, data, parameters, srh_sweep=None):
+        """
+        Update the figure with the hodograph for data, without saving it.
+        """
+        pylab.figure(self._fig.number)
+        pylab.sca(self._ax)
+
+        frame = _hodo_bounds(data, self.fixed)
+        if frame != self._frame:
+            for artist in self._frame_artists:
+                artist.remove()
+            self._frame_artists = _new_artists(self._ax, _plot_background, *frame)
+            pylab.xlim(frame[0], frame[1])
+            pylab.ylim(frame[2], frame[3])
+            self._frame = frame
+            self._background = None
+
+        # Removing a contour set also removes its labels, so skip anything
+        # that's already gone.
+        for artist in self._data_artists:
+            if artist.axes is not None:
+                artist.remove()
+        self._data_artists = []
+        if srh_sweep is not None:
+            self._data_artists.extend(_new_artists(self._ax, _plot_srh_sweep, data, srh_sweep, *frame))
+        self._data_artists.extend(_new_artists(self._ax, _plot_data, data, parameters))
+
+        if self._table_texts is None:
+            self._table_texts = _plot_param_table(parameters, web=self.web)
+        else:
+            for text, val in zip(self._table_texts, _param_table_values(parameters, web=self.web)):
+                text.set_text(val)
+
+        self._title.set_text("%s VWP valid %s" % (data.rid, data['time'].strftime("%d %b %Y %H%M UTC")))
+        if not self.archive:
+            sat_age = 6 * 3600
+            now = datetime.utcnow()
+            img_age = now - data['time']
+            age_cstop = min(_total_seconds(img_age) / sat_age, 1) * 0.4
+            age_color = mpl.colormaps['hot'](age_cstop)[:-1]
+
+            self._title.set_color(age_color)
+            self._age.set_color(age_color)
+            self._age.set_text("Image created on %s (%s old)" % (now.strftime("%d %b %Y %H%M UTC"), _fmt_timedelta(img_age)))
+
+    def _save(self, fname):
+        if not self.fixed:
+            self._fig.savefig(fname, dpi=self._fig.dpi)
+            return
+
+        # Fixed frame: draw everything but the data once, then blit.
+        canvas = self._fig.canvas
+        dynamic = self._dynamic_artists()
+        for artist in dynamic:
+            artist.set_animated(True)
+
+        if self._background is None:
+            canvas.draw()
+            self._background = canvas.copy_from_bbox(self._fig.bbox)
+
+        canvas.restore_region(self._background)
+        for artist in sorted(dynamic, key=lambda artist: artist.get_zorder()):
+            self._fig.draw_artist(artist)
+        mpl.image.imsave(fname, np.asarray(canvas.buffer_rgba()), dpi=self._fig.dpi)
+
+    def close(self):
+        pylab.close(self._fig)
+
+
 #...
 #...Additional functions to plot VWPs
 #...
-def _plot_vwp_background(times):
-    pylab.axvline(x=x_start, linestyle='-', linewidth=1, color='#b50000')
-    ivals = [x*((1-x_start)/(len(times))) for x in range(0, len(times))]
-    knt = 0
-    for iline in ivals:
-        pylab.axvline(x=iline+x_start, linestyle='-', linewidth=0.25, color='#cbcbcb')
-        slice_time = times[knt].strftime("%H%M")
-        pylab.text(iline+x_start, -0.017, slice_time, transform=pylab.gca().transAxes, fontsize=8, ha='center')
-        knt += 1
+def _plot_vwp_time(x, time, transform=None):
+    # The vertical line and time label for one VWP column. With a transform,
+    # they're drawn in that (axes-like) coordinate system instead.
+    if transform is None:
+        line = pylab.axvline(x=x+x_start, linestyle='-', linewidth=0.25, color='#cbcbcb')
+        transform = pylab.gca().transAxes
+    else:
+        line = pylab.plot([x+x_start, x+x_start], [0, 1], linestyle='-', linewidth=0.25, color='#cbcbcb', transform=transform)[0]
+    label = pylab.text(x+x_start, -0.017, time.strftime("%H%M"), transform=transform, fontsize=8, ha='center')
+    return [line, label]
 
+
+def _plot_vwp_frame():
     rect = Rectangle((x_start,0.), 1.1, 0.02, color='#c0adac')   
     pylab.gca().add_patch(rect)
 
@@ -351,34 +533,171 @@ def _plot_vwp_background(times):
     pylab.text(0.0222, 0, 'KFT', color='k', fontsize=10, fontweight='bold', ha='right')
 
 
-def _plot_vwp_data(data):
-    ivals = [x*((1-x_start)/(len(data))) for x in range(0, len(data))]
-    knt = 0
-    for iline in ivals:
-        u, v = vec2comp(data[knt]['wind_dir'], data[knt]['wind_spd'])
-        alt = data[knt]['altitude']
-        x = np.empty_like(alt)
-        x.fill(iline)
-        mpl.pyplot.barbs(x+x_start, (alt/max_alt)+0.03, u, v, data[knt]['wind_spd'], length=6, cmap=_vwp_cols, clim=(_vwp_levs[0],_vwp_levs[-1]), transform=pylab.gca().transAxes, clip_on=True, zorder=4, linewidth=1.)
-        # If the RMS exceeds _bad_rms, highlight with a red circle. Also, plot 
-        # the wind speeds as color-coded text next to the barbs
-        for klev in range(0, len(data[knt]['wind_spd'])):
-            rms = data[knt]['rms_error'][klev]
-            x_loc = x[klev]+(x_start + 0.002)
-            y_loc = (alt[klev]/max_alt) + 0.02
-            if rms >= _bad_rms:
-                ring = Circle((x_loc, y_loc+0.01), 0.01, linestyle='solid', fc='none', ec='red', linewidth=2)
-                pylab.gca().add_patch(ring)
-            spd = data[knt]['wind_spd'][klev]
-            text_spd = roundup(spd)
-            spd_idx = np.where(text_spd > _vwp_levs)[0]
-            if len(spd_idx) == 0:
-                spd_idx = 0
-            else:
-                spd_idx = spd_idx[-1]
-            spd_idx = np.clip(spd_idx, 0, len(_vwp_colors)-1) 
-            pylab.text(x_loc, y_loc, str(int(spd)), transform=pylab.gca().transAxes, fontsize=9, color=_vwp_colors[spd_idx], va='bottom')
-        knt += 1
+def _plot_vwp_background(times):
+    pylab.axvline(x=x_start, linestyle='-', linewidth=1, color='#b50000')
+    ivals = [x*((1-x_start)/(len(times))) for x in range(0, len(times))]
+    for knt, iline in enumerate(ivals):
+        _plot_vwp_time(iline, times[knt])
+
+    _plot_vwp_frame()
+
+
+def _text_path(label, prop, centered=False):
+    # Glyph outlines for a label (in points), built once per distinct label.
+    # By default the origin is at the left end of the bottom of the text, as
+    # for a Text with va='bottom'; the bottom is the font's descent below the
+    # baseline, whatever the glyphs.
+    key = (label, prop.get_size(), prop.get_weight(), centered)
+    if key not in _label_paths:
+        path = TextPath((0, 0), label, prop=prop)
+        if centered:
+            ext = path.get_extents()
+            path = path.transformed(Affine2D().translate(-(ext.x0 + ext.x1) / 2., -(ext.y0 + ext.y1) / 2.))
+        else:
+            descent = text_to_path.get_text_width_height_descent("lp", prop, ismath=False)[2]
+            path = path.transformed(Affine2D().translate(0, descent))
+        _label_paths[key] = path
+    return _label_paths[key]
+
+
+def _plot_vwp_levels(x, u, v, alt, wind_spd, rms_error, transform=None):
+    """
+    Barbs, speeds and bad-RMS rings for a set of VWP levels, which can span
+    any number of columns (x is the offset of each level's column). Everything
+    is drawn as one artist each. Returns the artists.
+    """
+    ax = pylab.gca()
+    if transform is None:
+        transform = ax.transAxes
+
+    x = x + x_start
+    artists = [mpl.pyplot.barbs(x, (alt/max_alt)+0.03, u, v, wind_spd, length=6, cmap=_vwp_cols, clim=(_vwp_levs[0],_vwp_levs[-1]), transform=transform, clip_on=True, zorder=4, linewidth=1.)]
+
+    # If the RMS exceeds _bad_rms, highlight with a red circle. Also, plot 
+    # the wind speeds as color-coded text next to the barbs
+    x_loc = x + 0.002
+    y_loc = (alt/max_alt) + 0.02
+
+    bad = rms_error >= _bad_rms
+    rings = EllipseCollection(0.02, 0.02, 0., units='xy', offsets=np.column_stack((x_loc[bad], y_loc[bad]+0.01)),
+        offset_transform=transform, facecolors='none', edgecolors='red', linewidths=2)
+    artists.append(ax.add_collection(rings, autolim=False))
+
+    # Color index is the number of levels below the speed rounded up to 10 kts
+    spd_idx = np.digitize(np.ceil(wind_spd / 10.0) * 10, _vwp_levs, right=True) - 1
+    spd_idx = np.clip(spd_idx, 0, len(_vwp_colors)-1)
+    labels = PathCollection([ _text_path(str(int(spd)), _label_font) for spd in wind_spd ], offsets=np.column_stack((x_loc, y_loc)), offset_transform=transform,
+        transform=Affine2D().scale(1 / 72.) + ax.figure.dpi_scale_trans, facecolors=[ _vwp_colors[idx] for idx in spd_idx ],
+        edgecolors='none', zorder=3, clip_on=False)
+    artists.append(ax.add_collection(labels, autolim=False))
+    return artists
+
+
+def _plot_vwp_data(cube):
+    ivals = [x*((1-x_start)/(len(cube))) for x in range(0, len(cube))]
+    valid = ~np.ma.getmaskarray(cube['altitude'])
+    x = np.broadcast_to(np.array(ivals)[:, np.newaxis], valid.shape)
+
+    _plot_vwp_levels(x[valid], cube['u'].filled(np.nan)[valid], cube['v'].filled(np.nan)[valid], cube['altitude'].data[valid],
+        cube['wind_spd'].filled(np.nan)[valid], cube['rms_error'].filled(np.nan)[valid])
+
+
+class VWPRenderer(object):
+    """
+    A VWP figure that's kept around between scans, for live updating. Adding a
+    profile draws just its column and slides the existing columns over by one
+    (dropping the oldest once there are num_columns of them), rather than
+    redrawing the whole VWP.
+    """
+    def __init__(self, radar_id, num_columns=28, archive=False):
+        self.rid = radar_id
+        self.num_columns = num_columns
+        self.archive = archive
+        self._columns = []
+
+        fig_aspect = 2.5714
+        fig_wid = 24
+        fig_hght = fig_wid / fig_aspect
+        self._fig = pylab.figure(figsize=(fig_wid, fig_hght), dpi=200)
+        self._ax = pylab.axes((0.01, 0.02, 0.99, 0.94))
+
+        pylab.axvline(x=x_start, linestyle='-', linewidth=1, color='#b50000')
+        _plot_vwp_frame()
+
+        pylab.xlim(0, 1.)
+        pylab.ylim(0, 1.)
+        pylab.xticks([])
+        pylab.yticks([])
+        pylab.box(False)
+
+        self._title = pylab.title("")
+        self._age = pylab.text(x_start, 1.03, "", transform=self._ax.transAxes, ha='left', va='top', fontsize=9)
+
+    def _activate(self):
+        pylab.figure(self._fig.number)
+        pylab.sca(self._ax)
+
+    def _column_offset(self, idx):
+        return idx * (1 - x_start) / self.num_columns
+
+    def add_profile(self, data, time):
+        """
+        Add the profile in data (e.g. a VADFile) valid at time. Columns are kept
+        in time order, newest first, so a late scan (e.g. one whose download
+        was retried) goes in its place among the others. A scan older than
+        every column of a full VWP is dropped. Returns False if it was dropped.
+        """
+        idx = len([ col_time for col_time, _, _ in self._columns if col_time > time ])
+        if idx >= self.num_columns:
+            return False
+
+        self._activate()
+
+        prof = wind_profile(data)
+        offset = Affine2D()
+        transform = offset + self._ax.transAxes
+        artists = _plot_vwp_time(0., time, transform=transform)
+        artists.extend(_plot_vwp_levels(np.zeros(len(prof.altitude)), prof.u, prof.v, prof.altitude, data['wind_spd'], data['rms_error'], transform=transform))
+
+        self._columns.insert(idx, (time, offset, artists))
+        for _, _, old_artists in self._columns[self.num_columns:]:
+            for artist in old_artists:
+                artist.remove()
+        del self._columns[self.num_columns:]
+
+        for idx, (_, col_offset, _) in enumerate(self._columns):
+            col_offset.clear().translate(self._column_offset(idx), 0)
+        return True
+
+    @property
+    def times(self):
+        return [ time for time, _, _ in self._columns ]
+
+    def save(self, fname=None):
+        if fname is None:
+            fname = "%s_vwp.png" % self.rid
+
+        self._update_title()
+        self._fig.savefig(fname, dpi=self._fig.dpi)
+
+    def _update_title(self):
+        img_title = "%s VWP valid ending %s" % (self.rid, self._columns[0][0].strftime("%d %b %Y %H%M UTC"))
+        self._title.set_text(img_title)
+
+        if not self.archive:
+            sat_age = 6 * 3600
+            now = datetime.utcnow()
+            img_age = now - self._columns[0][0]
+            age_cstop = min(_total_seconds(img_age) / sat_age, 1) * 0.4
+            age_color = mpl.colormaps['hot'](age_cstop)[:-1]
+
+            self._title.set_color(age_color)
+            self._age.set_color(age_color)
+            self._age.set_text("Image created on %s (%s old)" % (now.strftime("%d %b %Y %H%M UTC"), _fmt_timedelta(img_age)))
+
+    def close(self):
+        pylab.close(self._fig)
+
 
 def plot_vwp(data, times, parameters, fname=None, add_hodo=False, fixed=False, web=False, archive=False):
     img_title = "%s VWP valid ending %s" % (data[0].rid, times[0].strftime("%d %b %Y %H%M UTC"))
@@ -391,7 +710,7 @@ def plot_vwp(data, times, parameters, fname=None, add_hodo=False, fixed=False, w
     now = datetime.utcnow()
     img_age = now - times[0]
     age_cstop = min(_total_seconds(img_age) / sat_age, 1) * 0.4
-    age_color = mpl.cm.get_cmap('hot')(age_cstop)[:-1]
+    age_color = mpl.colormaps['hot'](age_cstop)[:-1]
 
     age_str = "Image created on %s (%s old)" % (now.strftime("%d %b %Y %H%M UTC"), _fmt_timedelta(img_age))
 
@@ -407,7 +726,7 @@ def plot_vwp(data, times, parameters, fname=None, add_hodo=False, fixed=False, w
     pylab.axes((axes_left, axes_bot, 0.99, axes_hght))
 
     _plot_vwp_background(times)
-    _plot_vwp_data(data)
+    _plot_vwp_data(VWPCube(data, times))
     #_plot_param_table(parameters, web=web)
 
     pylab.xlim(0, 1.)
@@ -428,22 +747,8 @@ def plot_vwp(data, times, parameters, fname=None, add_hodo=False, fixed=False, w
 
     if add_hodo:
         inset_ax = inset_axes(pylab.gca(), width="30%", height="55%", loc='upper left', bbox_to_anchor=(0.63,0,0.85,1), bbox_transform=pylab.gca().transAxes)
-        u, v = vec2comp(data[0]['wind_dir'], data[0]['wind_spd'])
+        min_u, max_u, min_v, max_v = _hodo_bounds(data[0], fixed)
 
-        if fixed or len(u) == 0:
-            ctr_u, ctr_v = 20, 20
-            size = 120
-        else:
-            ctr_u = u.mean()
-            ctr_v = v.mean()
-            size = max(u.max() - u.min(), v.max() - v.min()) + 20
-            size = max(120, size)
-
-        min_u = ctr_u - size / 2
-        max_u = ctr_u + size / 2
-        min_v = ctr_v - size / 2
-        max_v = ctr_v + size / 2
-        
         _plot_background(min_u, max_u, min_v, max_v)
         _plot_data(data[0], parameters)
         _plot_param_table(parameters, web=web)
@@ -459,4 +764,58 @@ def plot_vwp(data, times, parameters, fname=None, add_hodo=False, fixed=False, w
 
     if web:
         bounds = {'min_u':min_u, 'max_u':max_u, 'min_v':min_v, 'max_v':max_v}
-        print(json.dumps(bounds)) 
\ No newline at end of file
+        print(json.dumps(bounds)) 
+
+
+#...
+#...Animated loops
+#...
+def _loop_writer(fname, fps):
+    # Pick the animation writer from the file extension
+    ext = fname.rsplit('.', 1)[-1].lower()
+    name = {'gif': 'pillow', 'mp4': 'ffmpeg'}.get(ext)
+    if name is None or not mpl.animation.writers.is_available(name):
+        raise ValueError("Can't write a '%s' loop (available writers: %s)" % (ext, ", ".join(mpl.animation.writers.list())))
+    return mpl.animation.writers[name](fps=fps)
+
+
+def animate_hodographs(frames, fname, fps=4, dpi=None, web=False, fixed=False, archive=True, srh_sweep=None):
+    """
+    Write an animated loop (.gif or .mp4) of hodographs. frames is a sequence
+    of (data, parameters) pairs in the order they should be shown. Every
+    frame is drawn in the same figure and handed straight to the encoder.
+    Returns the number of frames written.
+    """
+    renderer = HodographRenderer(web=web, fixed=fixed, archive=archive)
+    writer = _loop_writer(fname, fps)
+
+    num_frames = 0
+    try:
+        with writer.saving(renderer._fig, fname, dpi or renderer._fig.dpi):
+            for data, parameters in frames:
+                renderer.draw(data, parameters, srh_sweep=srh_sweep)
+                writer.grab_frame()
+                num_frames += 1
+    finally:
+        renderer.close()
+    return num_frames
+
+
+def animate_vwp(data, times, fname, fps=4, dpi=100, num_columns=28, archive=True):
+    """
+    Write a scrolling VWP loop (.gif or .mp4). data and times are the profiles
+    and their times, oldest first; each frame adds one column to the VWP.
+    Returns the number of frames written.
+    """
+    renderer = VWPRenderer(data[0].rid, num_columns=num_columns, archive=archive)
+    writer = _loop_writer(fname, fps)
+
+    try:
+        with writer.saving(renderer._fig, fname, dpi):
+            for prof, time in zip(data, times):
+                renderer.add_profile(prof, time)
+                renderer._update_title()
+                writer.grab_frame()
+    finally:
+        renderer.close()
+    return len(times)
@@ -0,0 +1,158 @@
+from __future__ import print_function
+
+import os
+import sys
+import time
+import pstats
+import cProfile
+import threading
+from collections import defaultdict
+
+"""
+profiling.py
+Profiles a single call for the --profile option of vad.py and vwp.py. By
+default the call is run under cProfile and the stats are written as a .pstats
+file (for pstats, snakeviz, etc.). If the output file ends in .folded, the
+call's stack is sampled instead, and written as collapsed stacks for
+flamegraph.pl or speedscope. Either way, a summary of where the time went in
+vad_reader, params and plot is printed.
+"""
+
+_modules = ['vad_reader', 'params', 'plot']
+
+def _module(filename):
+    module = os.path.splitext(os.path.basename(filename))[0]
+    return module if module in _modules else 'other'
+
+
+class _StackSampler(object):
+    # Samples the stack of one thread every `interval` seconds
+    def __init__(self, thread_id, interval=0.001):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = defaultdict(int)
+        self.times = defaultdict(float)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+
+    def _run(self):
+        # Each sample is weighted by the time since the last one, since the
+        # sampler doesn't always get the GIL back on time.
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            elapsed, last = now - last, now
+
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append("%s:%s" % (os.path.splitext(os.path.basename(code.co_filename))[0], code.co_name))
+                frame = frame.f_back
+            if len(stack) > 0:
+                stack = ";".join(stack[::-1])
+                self.stacks[stack] += 1
+                self.times[stack] += elapsed
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stop.set()
+        self._thread.join()
+
+
+def _print_modules(total_time, self_time):
+    print("%-12s %10s %10s" % ("Module", "total (s)", "self (s)"))
+    for module in _modules:
+        print("%-12s %10.3f %10.3f" % (module, total_time[module], self_time[module]))
+    print("%-12s %10s %10.3f" % ('other', '', self_time['other']))
+
+
+def _summarize_stats(stats, top):
+    # stats.stats is {(file, line, func): (prim calls, calls, self time, cumulative time, callers)}
+    # A module's total time is the cumulative time of its functions that are
+    # called from outside it.
+    self_time = defaultdict(float)
+    total_time = defaultdict(float)
+    functions = defaultdict(list)
+    for (filename, lineno, func), (prim_calls, calls, tottime, cumtime, callers) in stats.stats.items():
+        module = _module(filename)
+        self_time[module] += tottime
+        if module != 'other':
+            functions[module].append((cumtime, tottime, calls, "%s:%d(%s)" % (module, lineno, func)))
+            if all(_module(caller[0]) != module for caller in callers):
+                total_time[module] += cumtime
+
+    _print_modules(total_time, self_time)
+
+    for module in _modules:
+        if len(functions[module]) == 0:
+            continue
+
+        print("\nTop %s functions by cumulative time:" % module)
+        print("  %10s %10s %8s  %s" % ("cum (s)", "self (s)", "calls", "function"))
+        for cumtime, tottime, calls, name in sorted(functions[module], reverse=True)[:top]:
+            print("  %10.3f %10.3f %8d  %s" % (cumtime, tottime, calls, name))
+
+
+def _summarize_samples(stack_times, top):
+    # Inclusive time for a function is the time of the samples with it anywhere in the stack
+    self_time = defaultdict(float)
+    total_time = defaultdict(float)
+    functions = defaultdict(lambda: [0., 0.])
+    for stack, elapsed in stack_times.items():
+        frames = stack.split(";")
+        self_time[_module(frames[-1].split(":")[0])] += elapsed
+        functions[frames[-1]][1] += elapsed
+        for frame in set(frames):
+            functions[frame][0] += elapsed
+        for module in set(_module(frame.split(":")[0]) for frame in frames) - set(['other']):
+            total_time[module] += elapsed
+
+    _print_modules(total_time, self_time)
+
+    for module in _modules:
+        funcs = [ (cumtime, tottime, name) for name, (cumtime, tottime) in functions.items() if _module(name.split(":")[0]) == module ]
+        if len(funcs) == 0:
+            continue
+
+        print("\nTop %s functions by cumulative time:" % module)
+        print("  %10s %10s  %s" % ("cum (s)", "self (s)", "function"))
+        for cumtime, tottime, name in sorted(funcs, reverse=True)[:top]:
+            print("  %10.3f %10.3f  %s" % (cumtime, tottime, name))
+
+
+def profile_call(out_file, func, *args, **kwargs):
+    """
+    Call func(*args, **kwargs) under the profiler, write the profile to
+    out_file and print a summary of the top functions in each module (set
+    top=N to change how many). Returns whatever func returns.
+    """
+    top = kwargs.pop('top', 15)
+
+    start = time.perf_counter()
+    if out_file.endswith('.folded'):
+        with _StackSampler(threading.current_thread().ident) as sampler:
+            result = func(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+
+        with open(out_file, 'w') as ffolded:
+            for stack, count in sorted(sampler.stacks.items()):
+                ffolded.write("%s %d\n" % (stack, count))
+
+        print("\nProfiled %s in %.3f s; collapsed stacks written to %s\n" % (func.__name__, elapsed, out_file))
+        _summarize_samples(sampler.times, top)
+    else:
+        prof = cProfile.Profile()
+        try:
+            result = prof.runcall(func, *args, **kwargs)
+        finally:
+            prof.dump_stats(out_file)
+        elapsed = time.perf_counter() - start
+
+        print("\nProfiled %s in %.3f s; stats written to %s\n" % (func.__name__, elapsed, out_file))
+        _summarize_stats(pstats.Stats(prof), top)
+    return result
@@ -0,0 +1,156 @@
+from __future__ import print_function
+
+import sys
+import json
+import time
+from datetime import datetime
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+"""
+runstats.py
+Lightweight timing of the stages of a run. Code wraps each stage (or each
+file within a stage) in span(), which does nothing unless a report has been
+started with start_report(). The report collects the spans, with counts and
+bytes for each stage, and the peak memory use of the run, and can be written
+out as JSON. Optionally, each span is also logged as a JSON line on stderr.
+"""
+
+# The report for this process, if any
+_report = None
+
+def _peak_rss():
+    # Peak resident set size in kB (ru_maxrss is in kB on Linux, bytes on macOS)
+    if resource is None:
+        return {}
+
+    scale = 1024. if sys.platform == 'darwin' else 1.
+    return {
+        'self': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+        'children': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale,
+    }
+
+
+class RunReport(object):
+    def __init__(self, name, log=False):
+        self.name = name
+        self.log = log
+        self.spans = []
+        self.error = None
+        self._start = time.time()
+        self._start_clock = time.perf_counter()
+
+    @contextmanager
+    def span(self, stage, **fields):
+        start = time.time()
+        clock = time.perf_counter()
+        record = dict(fields)
+        try:
+            yield record
+        finally:
+            record['stage'] = stage
+            record['start'] = start
+            record['duration'] = time.perf_counter() - clock
+            self.add(record)
+
+    def add(self, record):
+        """
+        Add a span record (a dict with at least stage, start and duration, and
+        optionally file, bytes, etc.).
+        """
+        self.spans.append(record)
+        if self.log:
+            print(json.dumps(dict(record, event='span', run=self.name)), file=sys.stderr)
+
+    def merge(self, records):
+        """
+        Add the spans from another report (e.g. one kept by a worker process).
+        """
+        for record in records:
+            self.add(record)
+
+    def stages(self):
+        """
+        Totals for each stage: count, total/min/max duration and bytes.
+        """
+        stages = {}
+        for record in self.spans:
+            stage = stages.setdefault(record['stage'], {'count': 0, 'total': 0., 'min': None, 'max': None, 'bytes': 0})
+            stage['count'] += record.get('count', 1)
+            stage['total'] += record['duration']
+            stage['min'] = record['duration'] if stage['min'] is None else min(stage['min'], record['duration'])
+            stage['max'] = record['duration'] if stage['max'] is None else max(stage['max'], record['duration'])
+            stage['bytes'] += record.get('bytes', 0)
+        return stages
+
+    def to_dict(self):
+        spans = [ dict(record, start=record['start'] - self._start) for record in self.spans ]
+        return {
+            'name': self.name,
+            'started': datetime.utcfromtimestamp(self._start).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            'wall_time': time.perf_counter() - self._start_clock,
+            'peak_rss_kb': _peak_rss(),
+            'stages': self.stages(),
+            'spans': sorted(spans, key=lambda record: record['start']),
+            'error': self.error,
+        }
+
+    def write(self, fname):
+        with open(fname, 'w') as freport:
+            json.dump(self.to_dict(), freport, indent=2)
+
+
+def start_report(name, log=False):
+    """
+    Start collecting spans for this process. Returns the new report.
+    """
+    global _report
+    _report = RunReport(name, log=log)
+    return _report
+
+
+def stop_report():
+    """
+    Stop collecting spans. Returns the report that was active, if any.
+    """
+    global _report
+    report, _report = _report, None
+    return report
+
+
+def active():
+    return _report is not None
+
+
+def fail(exc):
+    """
+    Record in the report that the run failed with exc.
+    """
+    if _report is not None:
+        _report.error = "%s: %s" % (type(exc).__name__, exc)
+
+
+def merge(records):
+    """
+    Add spans recorded elsewhere (e.g. in a worker process) to the report.
+    """
+    if _report is not None:
+        _report.merge(records)
+
+
+@contextmanager
+def span(stage, **fields):
+    """
+    Time the enclosed block as part of stage. Extra fields (e.g. file, bytes)
+    are stored with the span; the yielded dict can be updated to add more.
+    """
+    if _report is None:
+        yield {}
+        return
+
+    with _report.span(stage, **fields) as record:
+        yield record
@@ -0,0 +1,192 @@
+from __future__ import print_function
+
+import os
+import zlib
+import struct
+import argparse
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from wsr88d import nwswfos
+from vad_reader import _message_header, _product_description, _block_header, _halfword
+
+"""
+synth_nvw.py
+Writes synthetic, inflated Level 3 VWP (product code 48) files in the same
+form as the ones main.py produces, for testing and benchmarking without
+network access. The VCP, number of levels and number of VAD Algorithm Output
+pages can all be set. Each file has a product symbology block (wind barbs and
+altitude labels) and a tabular block, so it parses with either VADFile source.
+"""
+
+_line_length = 80
+_page_header = [
+    "                     VAD Algorithm Output %s",
+    "   ALT    U      V      W    DIR   SPD  RMS   DIV    SRNG   ELEV",
+    "  100ft  m/s    m/s   cm/s  deg   kt   kt   E-3/s   nm     deg",
+]
+
+def synthetic_profile(num_levels=30, seed=0, top=12.):
+    """
+    A veering, strengthening wind profile with some noise. Returns a dict of
+    the VADFile fields plus altitude (km above the radar).
+    """
+    rng = np.random.RandomState(seed)
+    spacing = (top - 0.1) / max(num_levels - 1, 1)
+    altitude = np.linspace(0.1, top, num_levels) + rng.uniform(-0.25, 0.25, num_levels) * spacing
+    # The jitter can take the lowest level below the radar, which has no slant range
+    altitude = np.maximum(altitude, 0.1)
+    frac = altitude / top
+
+    wind_dir = (150 + 120 * frac + rng.normal(0, 10, num_levels)) % 360
+    wind_spd = np.clip(15 + 60 * frac + rng.normal(0, 5, num_levels), 3, 150)
+    rms_error = rng.uniform(0.5, 12, num_levels)
+    divergence = np.where(np.arange(num_levels) % 3, np.nan, rng.uniform(-1, 1, num_levels))
+
+    # Pick an elevation angle for each level, then find the slant range that
+    # puts the beam at that altitude (the inverse of VADFile._get_data).
+    elev_angle = np.linspace(0.5, 19.5, num_levels)
+    r_e = 4. / 3. * 6371
+    b = 2 * r_e * np.sin(np.radians(elev_angle))
+    c = -(altitude ** 2 + 2 * r_e * altitude)
+    slant_range = (-b + np.sqrt(b ** 2 - 4 * c)) / 2
+
+    return {
+        'wind_dir':    np.round(wind_dir),
+        'wind_spd':    np.round(wind_spd),
+        'rms_error':   np.round(rms_error, 1),
+        'divergence':  np.round(divergence, 1),
+        'slant_range': slant_range,
+        'elev_angle':  np.round(elev_angle, 1),
+        'altitude':    altitude,
+    }
+
+
+def _table_lines(prof, vcp):
+    lines = []
+    for idx in range(len(prof['altitude'])):
+        div = "NA" if np.isnan(prof['divergence'][idx]) else "%.1f" % prof['divergence'][idx]
+        lines.append(" %5d %6.1f %6.1f   NA  %3d %5d %5.1f %5s %7.2f %5.1f" % (
+            int(prof['altitude'][idx] * 32.81), 0, 0, prof['wind_dir'][idx], prof['wind_spd'][idx],
+            prof['rms_error'][idx], div, prof['slant_range'][idx] / (6067.1 / 3281.), prof['elev_angle'][idx]))
+
+    if vcp in [80, 90]:
+        # The TDWR tables have an extra line at each end that the reader drops
+        lines = [ lines[0] ] + lines + [ lines[-1] ]
+    return lines
+
+
+def _symbology_block(prof, elevation):
+    packets = []
+    for idx, alt in enumerate(prof['altitude']):
+        y = 400 - idx * 12
+        label = ("%d" % round((alt * 1000 / 0.3048 + elevation) / 1000.)).encode('ascii')
+        if len(label) % 2:
+            label += b' '
+        packets.append(struct.pack('>hhhhh', 8, 6 + len(label), 2, 5, y) + label)
+
+    for idx in range(len(prof['altitude'])):
+        y = 400 - idx * 12
+        packets.append(struct.pack('>hhhhhhh', 4, 10, 1 + (idx % 5), 300, y, int(prof['wind_dir'][idx]), int(prof['wind_spd'][idx])))
+
+    layer = b''.join(packets)
+    header = _block_header.pack(-1, 1, _block_header.size + 8 + len(layer))
+    return header + struct.pack('>hhi', 1, -1, len(layer)) + layer
+
+
+def make_nvw(time, radar_id='KLOT', vcp=212, num_levels=30, num_pages=1, seed=0,
+             location=(41.604, -88.085, 663), compress=False):
+    """
+    Build a synthetic product-48 file valid at time. The levels are split
+    evenly over num_pages VAD Algorithm Output pages. If compress is True, the
+    product is zlib-compressed with a NOAAPORT header (like the .nids files
+    from THREDDS), otherwise it's returned inflated, as VADFile reads it.
+    """
+    prof = synthetic_profile(num_levels, seed=seed)
+    elevation = location[2]
+
+    lines = _table_lines(prof, vcp)
+    per_page = int(np.ceil(len(lines) / float(num_pages)))
+    stamp = time.strftime("%m/%d/%y %H:%M")
+    pages = [ [ _page_header[0] % stamp ] + _page_header[1:] + lines[idx:(idx + per_page)]
+              for idx in range(0, len(lines), per_page) ]
+
+    tabular = [ struct.pack('>hh', -1, len(pages)) ]
+    for page in pages:
+        for line in page:
+            tabular.append(_halfword.pack(_line_length) + line.encode('ascii').ljust(_line_length))
+        tabular.append(_halfword.pack(-1))
+    tabular = b''.join(tabular)
+
+    symbology = _symbology_block(prof, elevation)
+
+    days = (time - datetime(1969, 12, 31)).days
+    seconds = time.hour * 3600 + time.minute * 60 + time.second
+
+    def _pdb(offset_symbology, offset_tabular):
+        return _product_description.pack(-1, int(round(location[0] * 1000)), int(round(location[1] * 1000)), elevation,
+            48, 2, vcp, 1, 1, days, seconds, days, seconds, *([0] * 27), 0, 0, offset_symbology, 0, offset_tabular)
+
+    # Block offsets are in halfwords from the start of the message header
+    offset_symbology = (_message_header.size + _product_description.size) // 2
+    offset_tabular = offset_symbology + len(symbology) // 2
+
+    tabular_size = _block_header.size + _message_header.size + _product_description.size + len(tabular)
+    tabular_block = (_block_header.pack(-1, 3, tabular_size) + _message_header.pack(48, days, seconds, 0, 0, 0, 3)
+                     + _pdb(0, 0) + tabular)
+
+    body = _pdb(offset_symbology, offset_tabular) + symbology + tabular_block
+    length = _message_header.size + len(body)
+    message = _message_header.pack(48, days, seconds, length, 0, 0, 3) + body
+
+    wfo = nwswfos[radar_id]
+    wmo_header = ("SDUS34 K%s %s\r\r\nNVW%s\r\r\n" % (wfo, time.strftime("%d%H%M"), radar_id[1:])).encode('ascii')
+    product = wmo_header + message
+
+    if compress:
+        # 24-byte CCB, then the product in 4000-byte zlib blocks
+        raw = b'\x40\x00' + b'\0' * 22 + product
+        blocks = [ zlib.compress(raw[idx:(idx + 4000)]) for idx in range(0, len(raw), 4000) ]
+        return b"\x01\r\r\n000 \r\r\n" + wmo_header + b''.join(blocks) + b"\r\r\n\x03"
+    return product
+
+
+def write_series(out_path, radar_id='KLOT', start=datetime(2020, 5, 1, 12), num_scans=24, interval=5, **kwargs):
+    """
+    Write num_scans files, interval minutes apart, named as main.py names the
+    inflated files. Keyword arguments are passed to make_nvw. Returns the list
+    of file names.
+    """
+    if not os.path.exists(out_path):
+        os.makedirs(out_path)
+
+    seed = kwargs.pop('seed', 0)
+    fnames = []
+    for idx in range(num_scans):
+        time = start + timedelta(minutes=idx * interval)
+        fname = "%s/K%s_SDUS34_NVW%s_%s" % (out_path, nwswfos[radar_id], radar_id[1:], time.strftime("%Y%m%d%H%M"))
+        with open(fname, 'wb') as fnvw:
+            fnvw.write(make_nvw(time, radar_id=radar_id, seed=seed + idx, **kwargs))
+        fnames.append(fname)
+    return fnames
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('out_dir', help="Directory to write the files to.")
+    ap.add_argument('-r', '--radar-id', dest='radar_id', default='KLOT', help="Radar to name the files for. Defaults to KLOT.")
+    ap.add_argument('-t', '--start', dest='start', default='20200501/1200', help="Time of the first scan (YYYYMMDD/HHMM). Defaults to 20200501/1200.")
+    ap.add_argument('-n', '--num-scans', dest='num_scans', type=int, default=24, help="Number of files to write. Defaults to 24.")
+    ap.add_argument('-i', '--interval', dest='interval', type=int, default=5, help="Minutes between scans. Defaults to 5.")
+    ap.add_argument('-v', '--vcp', dest='vcp', type=int, default=212, help="VCP number. Defaults to 212.")
+    ap.add_argument('-l', '--levels', dest='levels', type=int, default=30, help="Number of levels in each profile. Defaults to 30.")
+    ap.add_argument('--pages', dest='pages', type=int, default=1, help="Number of VAD Algorithm Output pages. Defaults to 1.")
+    args = ap.parse_args()
+
+    fnames = write_series(args.out_dir, radar_id=args.radar_id.upper(), start=datetime.strptime(args.start, '%Y%m%d/%H%M'),
+        num_scans=args.num_scans, interval=args.interval, vcp=args.vcp, num_levels=args.levels, num_pages=args.pages)
+    print("Wrote %d files to %s" % (len(fnames), args.out_dir))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+import os
+import sys
+
+import matplotlib
+matplotlib.use('agg')
+
+# The modules live at the top level of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,76 @@
+import calendar
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import main
+
+
+class FakeDownloader(object):
+    # Serves a catalogue with one file per day, and records the URLs asked for
+    fetched = []
+
+    def __init__(self, workers=1):
+        pass
+
+    def get_many(self, urls):
+        results = []
+        for url in urls:
+            FakeDownloader.fetched.append(url)
+            date_str = url.split('/')[-2]
+            body = "<tt>Level3_LOT_NVW_%s_1200.nids</tt>" % date_str
+            results.append((url, body.encode('utf-8'), None))
+        return results
+
+
+@pytest.fixture
+def downloader(monkeypatch):
+    FakeDownloader.fetched = []
+    monkeypatch.setattr(main, 'Downloader', FakeDownloader)
+    main._catalog_cache.clear()
+    yield FakeDownloader
+    main._catalog_cache.clear()
+
+
+def _catalogue_url(date):
+    return "base/LOT/%s/catalog.html" % date.strftime("%Y%m%d")
+
+
+def test_listing_fetched_before_day_ended_is_refetched(downloader):
+    day = datetime.utcnow().date() - timedelta(days=2)
+    day_end = calendar.timegm(day.timetuple()) + 24 * 3600
+    url = _catalogue_url(day)
+
+    # Fetched a minute before 00Z, when this was still today
+    main._catalog_cache[url] = (day_end - 60, [])
+
+    start = day.strftime("%Y%m%d") + "/12"
+    files = main.find_files('KLOT', start, start, 'base', ttl=0)
+    assert url in downloader.fetched
+    assert "Level3_LOT_NVW_%s_1200" % day.strftime("%Y%m%d") in files
+
+
+def test_listing_fetched_after_day_ended_is_kept(downloader):
+    day = datetime.utcnow().date() - timedelta(days=2)
+    day_end = calendar.timegm(day.timetuple()) + 24 * 3600
+    url = _catalogue_url(day)
+    main._catalog_cache[url] = (day_end + 60, ['cached'])
+
+    start = day.strftime("%Y%m%d") + "/12"
+    files = main.find_files('KLOT', start, start, 'base', ttl=0)
+    assert url not in downloader.fetched
+    assert 'cached' in files
+
+
+def test_todays_listing_is_refetched_after_ttl(downloader):
+    today = datetime.utcnow()
+    url = _catalogue_url(today)
+    main._catalog_cache[url] = (time.time() - 10, ['cached'])
+
+    start = today.strftime("%Y%m%d/%H")
+    main.find_files('KLOT', start, start, 'base', ttl=60)
+    assert url not in downloader.fetched
+
+    main.find_files('KLOT', start, start, 'base', ttl=5)
+    assert url in downloader.fetched
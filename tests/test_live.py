@@ -0,0 +1,139 @@
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+import main
+import live
+from nvw_server import NVWServer
+
+
+@pytest.fixture
+def server(monkeypatch):
+    # Recent scans, so they're inside the window live.py asks the catalogue for
+    start = datetime.utcnow().replace(second=0, microsecond=0) - timedelta(minutes=50)
+    with NVWServer('KLOT', start=start, num_scans=8, num_levels=10) as server:
+        server.all_times = list(server.times)
+        del server.times[6:]
+
+        # Downloads asked for, those to answer with a 404 and those to garble
+        server.downloads = []
+        server.missing = set()
+        server.corrupt = set()
+        respond = server.respond
+        def _respond(path):
+            if '/fileServer/' in path:
+                scan_time = datetime.strptime(path[-18:-5], '%Y%m%d_%H%M')
+                server.downloads.append(scan_time)
+                if scan_time in server.missing:
+                    return 404, b"Not found", 'text/plain'
+                if scan_time in server.corrupt:
+                    return 200, b"Not an NVW product", 'application/octet-stream'
+            return respond(path)
+        server.respond = _respond
+
+        monkeypatch.setattr(live, 'base', server.thredds_base)
+        main._catalog_cache.clear()
+        yield server
+        main._catalog_cache.clear()
+
+
+@pytest.fixture
+def plotter(server, tmp_path):
+    plotter = live.LivePlotter('KLOT', str(tmp_path), num_columns=3, workers=2)
+    yield plotter
+    plotter._vwp.close()
+
+
+def _vad_name(plotter, scan_time):
+    return "%s/KLOT_%s_vad.png" % (plotter.out_path, scan_time.strftime('%Y%m%d%H%M'))
+
+
+def _check_columns(plotter, times):
+    # Newest first, each at its own offset
+    assert plotter._vwp.times == times
+    for idx, (_, offset, _) in enumerate(plotter._vwp._columns):
+        assert offset.get_matrix()[0, 2] == pytest.approx(plotter._vwp._column_offset(idx))
+
+
+def test_first_poll_backfills_num_columns(server, plotter):
+    times = server.all_times
+    fnames = plotter.poll()
+
+    assert sorted(server.downloads) == times[3:6]
+    assert fnames[:-1] == [ _vad_name(plotter, scan_time) for scan_time in times[3:6] ]
+    assert fnames[-1] == "%s/KLOT_vwp.png" % plotter.out_path
+    assert all(os.path.exists(fname) for fname in fnames)
+    _check_columns(plotter, times[5:2:-1])
+
+    # Nothing new, so nothing downloaded or written
+    server.downloads[:] = []
+    assert plotter.poll() == []
+    assert server.downloads == []
+
+
+def test_poll_fetches_only_new_scans(server, plotter):
+    times = server.all_times
+    plotter.poll()
+    num_artists = len(plotter._vwp._ax.get_children())
+
+    for idx in [6, 7]:
+        server.times.append(times[idx])
+        server.downloads[:] = []
+        fnames = plotter.poll()
+
+        assert server.downloads == [times[idx]]
+        assert fnames == [ _vad_name(plotter, times[idx]), "%s/KLOT_vwp.png" % plotter.out_path ]
+        _check_columns(plotter, times[idx:idx - 3:-1])
+
+        # The oldest column goes as the new one comes in
+        assert len(plotter._vwp._ax.get_children()) == num_artists
+
+
+def test_failed_download_is_retried(server, plotter):
+    times = server.all_times
+    server.missing.add(times[4])
+    fnames = plotter.poll()
+
+    assert fnames[:-1] == [ _vad_name(plotter, times[3]), _vad_name(plotter, times[5]) ]
+    _check_columns(plotter, [times[5], times[3]])
+
+    # The retried scan goes in between the columns either side of it
+    server.missing.clear()
+    server.downloads[:] = []
+    fnames = plotter.poll()
+
+    assert server.downloads == [times[4]]
+    assert fnames[0] == _vad_name(plotter, times[4])
+    _check_columns(plotter, times[5:2:-1])
+
+
+def test_retry_older_than_full_vwp_is_dropped(server, plotter):
+    times = server.all_times
+    server.missing.add(times[3])
+    plotter.poll()
+    for idx in [6, 7]:
+        server.times.append(times[idx])
+        plotter.poll()
+    _check_columns(plotter, times[7:4:-1])
+
+    server.missing.clear()
+    fnames = plotter.poll()
+
+    # The hodograph is still plotted, but the VWP is left alone
+    assert fnames[0] == _vad_name(plotter, times[3])
+    _check_columns(plotter, times[7:4:-1])
+
+
+def test_corrupt_product_is_skipped(server, plotter):
+    times = server.all_times
+    server.corrupt.add(times[4])
+    fnames = plotter.poll()
+
+    # The other scans and the VWP are still written, and the bad one isn't retried
+    assert fnames == [ _vad_name(plotter, times[3]), _vad_name(plotter, times[5]), "%s/KLOT_vwp.png" % plotter.out_path ]
+    _check_columns(plotter, [times[5], times[3]])
+
+    server.downloads[:] = []
+    assert plotter.poll() == []
+    assert server.downloads == []
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from params import vec2comp, comp2vec, compute_srh, compute_srh_sweep, compute_shear_mag, compute_parameters, compute_parameters_batch, WindProfile
+from synth_nvw import synthetic_profile
+
+
+def _profile(seed, shift=0.):
+    prof = synthetic_profile(20, seed=seed)
+    prof['altitude'] = prof['altitude'] + shift
+    return prof
+
+
+def _srh_reference(prof, storm_motion, hght):
+    # Layer by layer from the lowest level, as the original compute_srh did
+    u, v = vec2comp(prof['wind_dir'], prof['wind_spd'])
+    storm_u, storm_v = vec2comp(*storm_motion)
+    sru, srv = (u - storm_u) / 1.94, (v - storm_v) / 1.94
+    alt = prof['altitude']
+
+    below = alt < hght
+    sru_hght, srv_hght = np.interp(hght, alt, sru), np.interp(hght, alt, srv)
+    sru = np.append(sru[below], sru_hght)
+    srv = np.append(srv[below], srv_hght)
+    return ((sru[1:] * srv[:-1]) - (sru[:-1] * srv[1:])).sum()
+
+
+@pytest.mark.parametrize('shift', [0., -0.3])
+def test_srh_and_shear_start_at_lowest_level(shift):
+    prof = _profile(1, shift)
+    for hght in [1, 3]:
+        np.testing.assert_allclose(compute_srh(prof, (240, 30), hght), _srh_reference(prof, (240, 30), hght), rtol=1e-10)
+
+    u, v = vec2comp(prof['wind_dir'], prof['wind_spd'])
+    u_6km, v_6km = np.interp(6, prof['altitude'], u), np.interp(6, prof['altitude'], v)
+    np.testing.assert_allclose(compute_shear_mag(prof, 6), np.hypot(u_6km - u[0], v_6km - v[0]), rtol=1e-10)
+
+
+def test_batch_matches_single():
+    profs = [ _profile(seed) for seed in range(5) ]
+    stack = dict((key, np.stack([ prof[key] for prof in profs ])) for key in ['wind_dir', 'wind_spd', 'altitude'])
+    batch = compute_parameters_batch(stack, 'right-mover')
+    for idx, prof in enumerate(profs):
+        single = compute_parameters(prof, 'right-mover')
+        for key in ['srh_1km', 'srh_3km', 'shear_mag_6km', 'critical']:
+            np.testing.assert_array_equal(batch[key][idx], single[key])
+
+
+@pytest.mark.parametrize('shift', [0., -0.3])
+def test_srh_sweep_matches_helicity(shift):
+    prof = _profile(2, shift)
+    storm_u, storm_v = np.meshgrid(np.linspace(-40, 40, 9), np.linspace(-30, 50, 7))
+    sweep = compute_srh_sweep(prof, storm_u, storm_v, hghts=(1, 3, 6))
+
+    for hght in [1, 3, 6]:
+        brute = np.empty(storm_u.shape)
+        for idx in np.ndindex(storm_u.shape):
+            storm_motion = comp2vec(storm_u[idx], storm_v[idx])
+            brute[idx] = WindProfile(prof).helicity(storm_motion, None, hght)
+        np.testing.assert_allclose(sweep["srh_%dkm" % hght], brute, rtol=1e-8, atol=1e-8)
@@ -0,0 +1,130 @@
+import os
+import json
+from datetime import timedelta
+
+import pytest
+
+import main
+import runstats
+from nids_store import NIDSStore
+from nvw_server import NVWServer
+
+
+@pytest.fixture(scope='module')
+def server():
+    with NVWServer('KLOT', num_scans=4, num_levels=10) as server:
+        yield server
+
+
+def _fetch(server, output_path, **kwargs):
+    catalogue_base = "%s/%s/level3/NVW/" % (server.thredds_base, server.type_)
+    download_base = "%s/fileServer/%s/level3/NVW/" % (server.thredds_base, server.type_)
+    start_time = server.times[0].strftime('%Y%m%d/%H')
+    end_time = (server.times[-1] + timedelta(hours=1)).strftime('%Y%m%d/%H')
+
+    main._catalog_cache.clear()
+    files = main.find_files(server.radar_id, start_time, end_time, catalogue_base, workers=2)
+    main.download_files(files, start_time, end_time, download_base, workers=2, output_path=output_path, **kwargs)
+    return files
+
+
+def test_download_spans_per_file(server, tmp_path):
+    report = runstats.start_report('test')
+    try:
+        files = _fetch(server, str(tmp_path), store=None)
+    finally:
+        runstats.stop_report()
+
+    spans = [ span for span in report.spans if span['stage'] == 'download' ]
+    assert len(files) == 4
+    assert sorted(span['file'] for span in spans) == sorted(f + '.nids' for f in files)
+    assert all(span['bytes'] == os.path.getsize(str(tmp_path / span['file'])) for span in spans)
+
+
+def test_store_is_looked_up_when_called(server, tmp_path, monkeypatch):
+    store = NIDSStore(str(tmp_path / 'store'))
+    monkeypatch.setattr(main, 'STORE', store)
+    _fetch(server, str(tmp_path / 'run1'))
+    assert store.size() > 0
+
+    # Turning the store off means every file is downloaded again
+    monkeypatch.setattr(main, 'STORE', None)
+    requests = server.num_requests
+    _fetch(server, str(tmp_path / 'run2'))
+    without_store = server.num_requests - requests
+
+    # Otherwise, files already in the store aren't downloaded again
+    monkeypatch.setattr(main, 'STORE', store)
+    requests = server.num_requests
+    _fetch(server, str(tmp_path / 'run3'))
+    with_store = server.num_requests - requests
+
+    assert len(os.listdir(str(tmp_path / 'run3'))) == 4
+    assert without_store - with_store == 4
+
+
+def test_vwp_spans_reach_report(server, tmp_path):
+    output_path = str(tmp_path)
+    os.mkdir(output_path + '/plots')
+    files = _fetch(server, output_path, store=None)
+    main.inflate_files(server.radar_id, files, output_path)
+
+    report = runstats.start_report('test')
+    try:
+        main.run_vwp(output_path, server.radar_id)
+    finally:
+        runstats.stop_report()
+
+    stages = report.stages()
+    assert stages['parse']['count'] == 4 and stages['render']['count'] == 4
+    assert stages['run_vwp']['count'] == 1
+    assert os.path.exists("%s/plots/%s_vwp.png" % (output_path, server.radar_id))
+
+
+def test_report_written_when_run_fails(tmp_path, monkeypatch):
+    answers = iter(['KLOT', '20200501/12', '20200501/13', '', ''])
+    monkeypatch.setattr('builtins.input', lambda prompt: next(answers))
+    monkeypatch.setattr(main, 'find_files', lambda *args, **kwargs: ['Level3_LOT_NVW_20200501_1200'])
+    def download_files(*args, **kwargs):
+        raise IOError("Server went away")
+    monkeypatch.setattr(main, 'download_files', download_files)
+    monkeypatch.setattr(main, 'HOME_DIR', str(tmp_path))
+
+    with pytest.raises(IOError):
+        main.main()
+
+    with open(str(tmp_path / 'KLOT_report.json')) as freport:
+        report = json.load(freport)
+    assert report['error'] == "OSError: Server went away"
+    assert not runstats.active()
+
+
+def test_store_evicts_least_recently_used(tmp_path):
+    from datetime import datetime
+    store = NIDSStore(str(tmp_path), max_mb=0)
+    times = [ datetime(2020, 5, 1, 12, minute) for minute in [0, 5, 10] ]
+    for idx, time in enumerate(times):
+        store.put('KLOT', 'NVW', time, b'x' * 1000, evict=False)
+        path = store.path('KLOT', 'NVW', time)
+        os.utime(path, (idx, idx))
+
+    assert store.get('KLOT', 'NVW', times[0]) == b'x' * 1000
+    store.evict(2000)
+    assert store.get('KLOT', 'NVW', times[0]) is not None
+    assert store.get('KLOT', 'NVW', times[1]) is None
+    assert store.get('KLOT', 'NVW', times[2]) is not None
+
+
+def test_downloader_closes_connections(server):
+    from fetch import Downloader
+
+    urls = [ "%s/SI.%s/sn.last" % (server.tgftp_base, server.radar_id.lower()) ] * 4
+    downloader = Downloader(workers=2)
+    downloader.get_many(urls)
+    assert downloader._conns == []
+
+    with Downloader(workers=1) as downloader:
+        downloader.get(urls[0])
+        conns = list(downloader._conns)
+        assert len(conns) == 1
+    assert downloader._conns == [] and conns[0].sock is None
@@ -0,0 +1,34 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from params import compute_parameters
+from plot import HodographRenderer
+from synth_nvw import make_nvw
+from vad_reader import VADFile
+
+
+def _profiles(num):
+    profiles = []
+    for idx in range(num):
+        vad = VADFile(make_nvw(datetime(2020, 5, 1, 12) + timedelta(minutes=5 * idx), seed=idx))
+        vad.rid = 'KLOT'
+        profiles.append((vad, compute_parameters(vad, 'right-mover')))
+    return profiles
+
+
+@pytest.mark.parametrize('fixed', [False, True])
+def test_renderer_srh_sweep_several_frames(tmp_path, fixed):
+    renderer = HodographRenderer(fixed=fixed, archive=True)
+    try:
+        for idx, (vad, params) in enumerate(_profiles(3)):
+            fname = str(tmp_path / ("frame%d.png" % idx))
+            renderer.render(vad, params, fname, srh_sweep=1)
+            assert (tmp_path / ("frame%d.png" % idx)).stat().st_size > 0
+
+        # Only the last frame's artists are left on the axes
+        children = renderer._ax.get_children()
+        assert all(artist in children for artist in renderer._data_artists)
+    finally:
+        renderer.close()
@@ -0,0 +1,32 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from synth_nvw import synthetic_profile, make_nvw
+from vad_reader import VADFile, read_nids
+
+
+@pytest.mark.parametrize('num_levels', [2, 5, 10, 30])
+def test_profiles_are_valid(num_levels):
+    for seed in range(200):
+        prof = synthetic_profile(num_levels, seed=seed)
+        assert np.isfinite(prof['slant_range']).all()
+        assert (prof['altitude'] > 0).all() and (np.diff(prof['altitude']) > 0).all()
+
+
+@pytest.mark.parametrize('source', ['tabular', 'symbology'])
+def test_round_trip(source):
+    time = datetime(2020, 5, 1, 12)
+    prof = synthetic_profile(10, seed=3)
+    vad = VADFile(make_nvw(time, num_levels=10, seed=3), source=source)
+    assert vad['time'] == time
+    np.testing.assert_array_equal(vad['wind_dir'], prof['wind_dir'])
+    np.testing.assert_array_equal(vad['wind_spd'], prof['wind_spd'])
+
+
+def test_compressed_round_trip():
+    time = datetime(2020, 5, 1, 12)
+    vad = read_nids(make_nvw(time, num_levels=40, compress=True))
+    ref = VADFile(make_nvw(time, num_levels=40))
+    np.testing.assert_array_equal(vad['altitude'], ref['altitude'])
@@ -0,0 +1,50 @@
+import os
+
+import pytest
+
+import vad
+from synth_nvw import write_series
+
+
+@pytest.fixture
+def local_path(tmp_path):
+    write_series(str(tmp_path), num_scans=3, num_levels=20)
+    return str(tmp_path)
+
+
+def test_batch_creates_out_path(local_path):
+    out_path = os.path.join(local_path, 'new', 'plots')
+    fnames = vad.vad_plotter_batch('KLOT', local_path, out_path=out_path, cache_dir=None)
+    assert len(fnames) == 3
+    assert all(os.path.exists(fname) for fname in fnames)
+
+
+def test_vwp_loop_has_no_surface_wind(local_path, monkeypatch):
+    calls = {}
+    def animate_vwp(data, times, fname, **kwargs):
+        calls['data'] = data
+    def animate_hodographs(frames, fname, **kwargs):
+        calls['frames'] = list(frames)
+    monkeypatch.setattr(vad, 'animate_vwp', animate_vwp)
+    monkeypatch.setattr(vad, 'animate_hodographs', animate_hodographs)
+
+    vad.vad_loop('KLOT', local_path, fname='hodo.gif', vwp_fname='vwp.gif', sfc_wind='240/20', cache_dir=None)
+
+    assert len(calls['frames']) == 3 and len(calls['data']) == 3
+    for (hodo, params), prof in zip(calls['frames'], calls['data']):
+        assert len(hodo['altitude']) == 21 and hodo['rms_error'][0] == 0.
+        assert len(prof['altitude']) == 20 and prof['rms_error'][0] != 0.
+
+
+def test_parallel_batch_matches_serial(tmp_path):
+    local_path = str(tmp_path)
+    write_series(local_path, num_scans=6, num_levels=20)
+
+    images = {}
+    for workers in [ 1, 3 ]:
+        out_path = os.path.join(local_path, 'plots_%d' % workers)
+        fnames = vad.vad_plotter_batch('KLOT', local_path, out_path=out_path, workers=workers, cache_dir=None)
+        images[workers] = [ (os.path.basename(fname), open(fname, 'rb').read()) for fname in fnames ]
+
+    assert len(images[1]) == 6
+    assert images[3] == images[1]
@@ -0,0 +1,39 @@
+import os
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from synth_nvw import make_nvw
+from vad_cache import load_vad, _cache_path
+
+
+@pytest.fixture
+def product():
+    return make_nvw(datetime(2020, 5, 1, 12), num_levels=20)
+
+
+def _assert_same(vad, ref):
+    assert vad['time'] == ref['time']
+    for key in ['wind_dir', 'wind_spd', 'rms_error', 'altitude']:
+        np.testing.assert_array_equal(vad[key], ref[key])
+
+
+def test_cached_profile_matches_parse(product, tmp_path):
+    ref = load_vad(product, cache_dir=None)
+    load_vad(product, cache_dir=str(tmp_path))
+    assert os.path.exists(_cache_path(product, str(tmp_path)))
+    _assert_same(load_vad(product, cache_dir=str(tmp_path)), ref)
+
+
+@pytest.mark.parametrize('truncate', [0, 10, 200])
+def test_corrupt_entry_is_replaced(product, tmp_path, truncate):
+    ref = load_vad(product, cache_dir=str(tmp_path))
+    path = _cache_path(product, str(tmp_path))
+    with open(path, 'rb') as fcache:
+        data = fcache.read()
+    with open(path, 'wb') as fcache:
+        fcache.write(data[:truncate])
+
+    _assert_same(load_vad(product, cache_dir=str(tmp_path)), ref)
+    assert os.path.getsize(path) == len(data)
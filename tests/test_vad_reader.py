@@ -0,0 +1,58 @@
+import io
+import mmap
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from synth_nvw import make_nvw
+from vad_reader import VADFile, VWPCube, inflate_nids
+
+
+@pytest.fixture
+def product():
+    return make_nvw(datetime(2020, 5, 1, 12), num_levels=25, num_pages=2)
+
+
+def _assert_same(vad, ref):
+    for key in VADFile.fields + ['altitude']:
+        np.testing.assert_array_equal(vad[key], ref[key])
+
+
+def test_buffers_parse_the_same(product, tmp_path):
+    ref = VADFile(io.BytesIO(product))
+    _assert_same(VADFile(product), ref)
+    _assert_same(VADFile(bytearray(product)), ref)
+    _assert_same(VADFile(memoryview(product)), ref)
+
+    path = tmp_path / 'nvw'
+    path.write_bytes(product)
+    with open(str(path), 'rb') as fnvw:
+        buf = mmap.mmap(fnvw.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            _assert_same(VADFile(buf), ref)
+        finally:
+            buf.close()
+
+
+def test_pages_and_sources_agree(product):
+    one_page = VADFile(make_nvw(datetime(2020, 5, 1, 12), num_levels=25, num_pages=1))
+    _assert_same(VADFile(product), one_page)
+
+    barbs = VADFile(product, source='symbology')
+    np.testing.assert_array_equal(barbs['wind_dir'], one_page['wind_dir'])
+    np.testing.assert_array_equal(barbs['wind_spd'], one_page['wind_spd'])
+
+
+def test_inflate_nids(product):
+    compressed = make_nvw(datetime(2020, 5, 1, 12), num_levels=25, num_pages=2, compress=True)
+    assert inflate_nids(compressed) == product
+
+
+def test_vwp_cube_pads_short_profiles():
+    profiles = [ VADFile(make_nvw(datetime(2020, 5, 1, 12, 5 * idx), num_levels=num_levels, seed=idx))
+                 for idx, num_levels in enumerate([10, 15]) ]
+    cube = VWPCube(profiles)
+    assert cube['wind_spd'].shape == (2, 15)
+    assert cube['wind_spd'].mask[0, 10:].all() and not cube['wind_spd'].mask[1].any()
+    np.testing.assert_array_equal(cube['altitude'][1], profiles[1]['altitude'])
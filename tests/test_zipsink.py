@@ -0,0 +1,51 @@
+import os
+import zipfile
+
+import pytest
+
+from zipsink import ZipSink
+
+
+@pytest.fixture
+def files(tmp_path):
+    root = tmp_path / 'data'
+    (root / 'plots').mkdir(parents=True)
+    (root / 'plots' / 'a.png').write_bytes(b'png' * 100)
+    (root / 'K_SDUS34_NVWLOT_202005011200').write_bytes(b'nvw' * 100)
+    return root
+
+
+def test_zip_published_on_success(files, tmp_path):
+    zip_path = str(tmp_path / 'out.zip')
+    with ZipSink(zip_path, str(files)) as sink:
+        sink(str(files / 'plots' / 'a.png'))
+        sink(str(files / 'K_SDUS34_NVWLOT_202005011200'))
+        sink(str(files / 'plots' / 'a.png'))
+
+    assert not os.path.exists(zip_path + '.part')
+    with zipfile.ZipFile(zip_path) as fzip:
+        info = dict((info.filename, info) for info in fzip.infolist())
+    assert sorted(info) == ['K_SDUS34_NVWLOT_202005011200', 'plots/a.png']
+    assert info['plots/a.png'].compress_type == zipfile.ZIP_STORED
+    assert info['K_SDUS34_NVWLOT_202005011200'].compress_type == zipfile.ZIP_DEFLATED
+
+
+def test_images_only(files, tmp_path):
+    zip_path = str(tmp_path / 'out.zip')
+    with ZipSink(zip_path, str(files), include_data=False) as sink:
+        sink(str(files / 'plots' / 'a.png'))
+        sink(str(files / 'K_SDUS34_NVWLOT_202005011200'))
+
+    with zipfile.ZipFile(zip_path) as fzip:
+        assert fzip.namelist() == ['plots/a.png']
+
+
+def test_failed_run_leaves_no_zip(files, tmp_path):
+    zip_path = str(tmp_path / 'out.zip')
+    with pytest.raises(RuntimeError):
+        with ZipSink(zip_path, str(files)) as sink:
+            sink(str(files / 'plots' / 'a.png'))
+            raise RuntimeError("plotting failed")
+
+    assert not os.path.exists(zip_path)
+    assert not os.path.exists(zip_path + '.part')
@@ -2,17 +2,24 @@ from __future__ import print_function
 
 import numpy as np
 
+import os
 import sys
 
-from vad_reader import download_vad, VADFile
+from vad_reader import download_vad
+from vad_cache import load_vad, CACHE_DIR
 from params import compute_parameters
-from plot import plot_hodograph
+from plot import plot_hodograph, HodographRenderer, animate_hodographs, animate_vwp
 from wsr88d import nwswfos
+import runstats
+from profiling import profile_call
 
 import re
 import argparse
+import traceback
 from datetime import datetime, timedelta
 import json
+from glob import glob
+from concurrent.futures import ProcessPoolExecutor
 
 """
 vad.py
@@ -24,6 +31,10 @@ Modified:   26 April 2015
                 Migrated to its own package, ravamped plot, fixed SRH calculations for real this time.
             30 March 2016
                 Fixed RMS error circle size, and added Bunkers motion vector calculations.
+            17 October 2026
+                Added batch plotting of local files in a single process, optionally
+                spread over a pool of worker processes.
+                Added animated hodograph and VWP loops of local files.
 """
 
 def is_vector(vec_str):
@@ -60,7 +71,32 @@ def parse_time(time_str):
 
     return plot_time
 
-def vad_plotter(radar_id, storm_motion='right-mover', sfc_wind=None, time=None, fname=None, local_path=None, web=False, fixed=False):
+def _local_file_name(local_path, radar_id, plot_time):
+    return "%s/K%s%s_SDUS34_NVW%s_%s" % (local_path, radar_id[0][1:], nwswfos[radar_id], radar_id[1:], plot_time.strftime("%Y%m%d%H%M"))
+
+
+def _prepare_vad(vad, radar_id, storm_motion, sfc_wind):
+    vad.rid = radar_id
+
+    if sfc_wind:
+        sfc_wind = parse_vector(sfc_wind)
+        vad.add_surface_wind(sfc_wind)
+
+    return compute_parameters(vad, storm_motion)
+
+
+def _plot_vad(vad, radar_id, storm_motion, sfc_wind, fname, web, fixed, archive, srh_sweep=None, renderer=None):
+    with runstats.span('params'):
+        params = _prepare_vad(vad, radar_id, storm_motion, sfc_wind)
+
+    with runstats.span('render', file=fname):
+        if renderer is not None:
+            renderer.render(vad, params, fname, srh_sweep=srh_sweep)
+        else:
+            plot_hodograph(vad, params, fname=fname, web=web, fixed=fixed, archive=archive, srh_sweep=srh_sweep)
+
+
+def vad_plotter(radar_id, storm_motion='right-mover', sfc_wind=None, time=None, fname=None, local_path=None, web=False, fixed=False, cache_dir=CACHE_DIR, srh_sweep=None):
     plot_time = None
     if time:
         plot_time = parse_time(time)
@@ -73,22 +109,192 @@ def vad_plotter(radar_id, storm_motion='right-mover', sfc_wind=None, time=None,
     if local_path is None:
         vad = download_vad(radar_id, time=plot_time)
     else:
+        iname = _local_file_name(local_path, radar_id, plot_time)
+        with runstats.span('parse', file=iname, bytes=os.path.getsize(iname)):
+            vad = load_vad(iname, cache_dir=cache_dir)
 
-        iname = "%s/K%s%s_SDUS34_NVW%s_%s" % (local_path, radar_id[0][1:], nwswfos[radar_id], radar_id[1:], plot_time.strftime("%Y%m%d%H%M"))
-        vad = VADFile(open(iname, 'rb'))
+    if not web:
+        print("Valid time:", vad['time'].strftime("%d %B %Y %H%M UTC"))
 
+    _plot_vad(vad, radar_id, storm_motion, sfc_wind, fname, web, fixed, (local_path is not None), srh_sweep=srh_sweep)
 
-    vad.rid = radar_id
 
-    if not web:
-        print("Valid time:", vad['time'].strftime("%d %B %Y %H%M UTC"))
+def _init_worker():
+    np.seterr(all='ignore')
+
+
+def _plot_files(radar_id, inames, storm_motion, sfc_wind, out_path, fixed, cache_dir, srh_sweep, sink=None):
+    # One figure for the whole batch
+    renderer = HodographRenderer(fixed=fixed, archive=True)
+
+    fnames = []
+    for iname in inames:
+        fname = "%s/%s_%s_vad.png" % (out_path, radar_id, iname[-12:])
+        print("Plotting VAD: %s" % iname)
+
+        # One bad file shouldn't stop the rest of the batch, but show where it
+        # failed, since it could be a bug rather than a bad file.
+        try:
+            with runstats.span('parse', file=iname, bytes=os.path.getsize(iname)):
+                vad = load_vad(iname, cache_dir=cache_dir)
+            _plot_vad(vad, radar_id, storm_motion, sfc_wind, fname, False, fixed, True, srh_sweep=srh_sweep, renderer=renderer)
+        except Exception as exc:
+            print("Could not plot '%s': %s" % (iname, exc))
+            traceback.print_exc()
+            continue
+
+        fnames.append(fname)
+        if sink is not None:
+            sink(fname)
+
+    renderer.close()
+    return fnames
+
+
+def _plot_files_chunk(args):
+    # Forked workers start with a copy of the parent's report, so start
+    # afresh and send the spans back with the images.
+    instrument, args = args[0], args[1:]
+    runstats.stop_report()
+    if not instrument:
+        return _plot_files(*args), []
+
+    report = runstats.start_report('worker')
+    fnames = _plot_files(*args)
+    runstats.stop_report()
+    return fnames, report.spans
+
+
+def _local_files(local_path, radar_id, times=None):
+    if times is None:
+        return sorted(glob("%s/K%s_SDUS*_NVW%s_*" % (local_path, nwswfos[radar_id], radar_id[1:])))
+    return [ _local_file_name(local_path, radar_id, plot_time) for plot_time in times ]
+
+
+def vad_plotter_batch(radar_id, local_path, times=None, storm_motion='right-mover', sfc_wind=None, out_path=None, fixed=False, workers=1, cache_dir=CACHE_DIR, srh_sweep=None, sink=None):
+    """
+    Plot hodographs for many local NVW files in one process, writing each one
+    to <out_path>/<radar_id>_<YYYYMMDDHHMM>_vad.png. If times (a list of
+    datetimes) isn't given, every file for this radar in local_path is plotted.
+    out_path defaults to local_path/plots. With workers > 1, the files are
+    split into chunks and plotted by a pool of worker processes. Parsed
+    profiles are cached in cache_dir (None to disable). If sink is given, it's
+    called with the name of each image as soon as it's written (e.g. a
+    zipsink.ZipSink). Returns the list of images written.
+    """
+    inames = _local_files(local_path, radar_id, times)
+
+    if out_path is None:
+        out_path = "%s/plots" % local_path
+    if not os.path.exists(out_path):
+        os.makedirs(out_path)
+
+    if workers <= 1 or len(inames) <= 1:
+        return _plot_files(radar_id, inames, storm_motion, sfc_wind, out_path, fixed, cache_dir, srh_sweep, sink=sink)
+
+    # A few chunks per worker so one slow chunk doesn't hold up the pool
+    chunk_size = max(1, int(np.ceil(len(inames) / (4. * workers))))
+    chunks = [ (runstats.active(), radar_id, inames[idx:(idx + chunk_size)], storm_motion, sfc_wind, out_path, fixed, cache_dir, srh_sweep)
+               for idx in range(0, len(inames), chunk_size) ]
+
+    fnames = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        for chunk_fnames, spans in pool.map(_plot_files_chunk, chunks):
+            runstats.merge(spans)
+            fnames.extend(chunk_fnames)
+            if sink is not None:
+                for fname in chunk_fnames:
+                    sink(fname)
+    return fnames
 
-    if sfc_wind:
-        sfc_wind = parse_vector(sfc_wind)
-        vad.add_surface_wind(sfc_wind)
 
-    params = compute_parameters(vad, storm_motion)
-    plot_hodograph(vad, params, fname=fname, web=web, fixed=fixed, archive=(local_path is not None))
+def _loop_frames(radar_id, inames, storm_motion, sfc_wind, cache_dir, profiles):
+    for iname in inames:
+        print("Adding VAD: %s" % iname)
+        try:
+            vad = load_vad(iname, cache_dir=cache_dir)
+            vad.rid = radar_id
+
+            # The surface wind only goes on the hodograph, not the VWP
+            hodo = vad.copy()
+            params = _prepare_vad(hodo, radar_id, storm_motion, sfc_wind)
+        except Exception as exc:
+            print("Could not plot '%s': %s" % (iname, exc))
+            traceback.print_exc()
+            continue
+
+        profiles.append((vad, datetime.strptime(iname[-12:], "%Y%m%d%H%M")))
+        yield hodo, params
+
+
+def vad_loop(radar_id, local_path, fname=None, vwp_fname=None, times=None, storm_motion='right-mover', sfc_wind=None, fixed=False, fps=4, num_columns=28, cache_dir=CACHE_DIR, srh_sweep=None):
+    """
+    Write an animated hodograph loop of local NVW files to fname and/or a
+    scrolling VWP loop to vwp_fname (.gif, or .mp4 if ffmpeg is installed).
+    The frames go straight to the encoder; no images are written for the
+    individual scans. Files are chosen as in vad_plotter_batch.
+    """
+    inames = _local_files(local_path, radar_id, times)
+
+    profiles = []
+    frames = _loop_frames(radar_id, inames, storm_motion, sfc_wind, cache_dir, profiles)
+    if fname is not None:
+        animate_hodographs(frames, fname, fps=fps, fixed=fixed, srh_sweep=srh_sweep)
+    else:
+        for frame in frames:
+            pass
+
+    if vwp_fname is not None and len(profiles) > 0:
+        animate_vwp([ vad for vad, _ in profiles ], [ time for _, time in profiles ], vwp_fname, fps=fps, num_columns=num_columns)
+
+def _run(ap, args, cache_dir):
+    if args.batch:
+        if args.local_path is None:
+            ap.error("'-p' ('--local-path') is required in batch mode.")
+
+        if args.loop is not None or args.vwp_loop is not None:
+            vad_loop(args.radar_id,
+                args.local_path,
+                fname=args.loop,
+                vwp_fname=args.vwp_loop,
+                storm_motion=args.storm_motion,
+                sfc_wind=args.sfc_wind,
+                fixed=args.fixed,
+                fps=args.fps,
+                cache_dir=cache_dir,
+                srh_sweep=args.srh_sweep
+            )
+            return
+
+        vad_plotter_batch(args.radar_id,
+            args.local_path,
+            storm_motion=args.storm_motion,
+            sfc_wind=args.sfc_wind,
+            out_path=args.out_dir,
+            fixed=args.fixed,
+            workers=args.workers,
+            cache_dir=cache_dir,
+            srh_sweep=args.srh_sweep
+        )
+        return
+
+    try:
+        vad_plotter(args.radar_id,
+            storm_motion=args.storm_motion,
+            sfc_wind=args.sfc_wind,
+            time=args.time,
+            fname=args.img_name,
+            local_path=args.local_path,
+            web=args.web,
+            fixed=args.fixed,
+            cache_dir=cache_dir,
+            srh_sweep=args.srh_sweep
+        )
+    except Exception:
+        if args.web:
+            print(json.dumps({'error':'error'}))
+        else:
+            raise
 
 
 def main():
@@ -101,25 +307,35 @@ def main():
     ap.add_argument('-p', '--local-path', dest='local_path', help="Path to local data. If not given, download from the Internet.")
     ap.add_argument('-w', '--web-mode', dest='web', action='store_true')
     ap.add_argument('-x', '--fixed-frame', dest='fixed', action='store_true')
+    ap.add_argument('-b', '--batch', dest='batch', action='store_true', help="Plot every file for this radar in the local path (-p). Images are written to the directory given by -o.")
+    ap.add_argument('-o', '--out-dir', dest='out_dir', help="Directory for the images produced in batch mode. Defaults to <local path>/plots.")
+    ap.add_argument('--srh-sweep', dest='srh_sweep', type=int, choices=[1, 3], help="Contour the 0-1 or 0-3 km SRH that each storm motion on the hodograph would have.")
+    ap.add_argument('--no-cache', dest='no_cache', action='store_true', help="Don't use (or update) the cache of parsed local files.")
+    ap.add_argument('--loop', dest='loop', help="In batch mode, write an animated loop of the hodographs to this file (.gif or .mp4) instead of individual images.")
+    ap.add_argument('--vwp-loop', dest='vwp_loop', help="In batch mode, write a scrolling VWP loop to this file (.gif or .mp4).")
+    ap.add_argument('--fps', dest='fps', type=float, default=4, help="Frames per second for --loop and --vwp-loop. Defaults to 4.")
+    ap.add_argument('-n', '--workers', dest='workers', type=int, default=1, help="Number of processes to plot with in batch mode. Defaults to 1.")
+    ap.add_argument('--report', dest='report', help="Write a JSON report of how long each stage (parsing, parameters, plotting) took to this file.")
+    ap.add_argument('--log-spans', dest='log_spans', action='store_true', help="Log the time taken by each stage as JSON lines on stderr.")
+    ap.add_argument('--profile', dest='profile', help="Profile the run and write the stats to this file (.pstats), or collapsed stacks for a flame graph if it ends in .folded. Worker processes (-n) aren't profiled.")
+    ap.add_argument('--profile-top', dest='profile_top', type=int, default=15, help="Number of functions per module in the profile summary. Defaults to 15.")
     args = ap.parse_args()
 
     np.seterr(all='ignore')
+    cache_dir = None if args.no_cache else CACHE_DIR
+
+    if args.report is not None or args.log_spans:
+        runstats.start_report('vad', log=args.log_spans)
 
     try:
-        vad_plotter(args.radar_id,
-            storm_motion=args.storm_motion,
-            sfc_wind=args.sfc_wind,
-            time=args.time,
-            fname=args.img_name,
-            local_path=args.local_path,
-            web=args.web,
-            fixed=args.fixed
-        )
-    except:
-        if args.web:
-            print(json.dumps({'error':'error'}))
+        if args.profile is not None:
+            profile_call(args.profile, _run, ap, args, cache_dir, top=args.profile_top)
         else:
-            raise
+            _run(ap, args, cache_dir)
+    finally:
+        report = runstats.stop_report()
+        if args.report is not None:
+            report.write(args.report)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,94 @@
+import hashlib
+import os
+import tempfile
+import zipfile
+from datetime import datetime
+
+import numpy as np
+
+from vad_reader import VADFile, PARSER_VERSION
+
+"""
+vad_cache.py
+On-disk cache of parsed VAD profiles. Each inflated NVW product is keyed by a
+hash of its contents (and the parser version), and the arrays VADFile produces
+are stored next to its time, VCP and radar location in a small .npz file, so
+re-plotting an event doesn't have to parse every product again. Entries are
+small (a few kB each), and the cache isn't pruned; remove the directory to
+clear it.
+"""
+
+CACHE_DIR = os.environ.get('VAD_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'vad-archive-plots'))
+_time_fmt = '%Y%m%d%H%M%S'
+
+def _cache_path(product, cache_dir):
+    key = hashlib.sha1(("%d:" % PARSER_VERSION).encode('utf-8') + product).hexdigest()
+    return os.path.join(cache_dir, key[:2], "%s.npz" % key)
+
+def _load(path):
+    with np.load(path) as cached:
+        if int(cached['parser_version']) != PARSER_VERSION:
+            raise ValueError("Cached profile is from a different parser version.")
+
+        data = dict((key, cached[key]) for key in VADFile.fields + ['altitude'])
+        time = datetime.strptime(str(cached['time']), _time_fmt)
+        return VADFile.from_arrays(data, time, int(cached['vcp']), tuple(cached['radar_location']))
+
+def _save(path, vad):
+    arrays = dict((key, vad[key]) for key in VADFile.fields + ['altitude'])
+    arrays['time'] = np.array(vad['time'].strftime(_time_fmt))
+    arrays['vcp'] = np.array(vad._vcp)
+    arrays['radar_location'] = np.array([vad._radar_latitude, vad._radar_longitude, vad._radar_elevation], dtype=float)
+    arrays['parser_version'] = np.array(PARSER_VERSION)
+
+    cache_dir = os.path.dirname(path)
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+
+    # Write under a temporary name first so a partially-written file is never
+    # picked up by another process.
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as fcache:
+            np.savez(fcache, **arrays)
+        os.replace(tmp_path, path)
+    except (IOError, OSError):
+        os.remove(tmp_path)
+        raise
+
+def load_vad(source, cache_dir=CACHE_DIR):
+    """
+    Return a VADFile for an inflated NVW product, using the cached arrays if
+    this product has been parsed before. source is a file name, an open file
+    or the product bytes. The cache is best-effort: if it can't be read or
+    written, the product is just parsed as usual. Passing cache_dir=None skips
+    the cache entirely.
+    """
+    if isinstance(source, str):
+        with open(source, 'rb') as fvad:
+            product = fvad.read()
+    elif hasattr(source, 'read'):
+        product = source.read()
+    else:
+        product = bytes(source)
+
+    if cache_dir is None:
+        return VADFile(product)
+
+    path = _cache_path(product, cache_dir)
+    if os.path.exists(path):
+        try:
+            return _load(path)
+        except (IOError, OSError, KeyError, ValueError, EOFError, zipfile.BadZipFile):
+            # Unreadable or truncated entry; drop it and parse again
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    vad = VADFile(product)
+    try:
+        _save(path, vad)
+    except (IOError, OSError):
+        pass
+    return vad
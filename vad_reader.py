@@ -2,6 +2,10 @@ from __future__ import print_function
 import numpy as np
 
 import struct
+import zlib
+import io
+import mmap
+import copy
 from datetime import datetime, timedelta
 
 try:
@@ -11,9 +15,76 @@ except ImportError:
 import socket
 import re
 
+from params import vec2comp, comp2vec, _interp, WindProfile
+
+# Bump this whenever a change to VADFile alters the data it produces, so that
+# cached profiles (see vad_cache.py) are re-parsed.
+PARSER_VERSION = 1
+
 _base_url = "ftp://tgftp.nws.noaa.gov/SL.us008001/DF.of/DC.radar/DS.48vwp/"
 _gsd_base = "https://rucsoundings.noaa.gov/get_soundings.cgi?data_source=Bak40&"
 
+def _is_zlib(buf):
+    """
+    Check for the 0x78 compression-method byte pair that begins a zlib stream.
+    """
+    return len(buf) >= 2 and (buf[0] & 0x0F) == 8 and ((buf[0] << 8) + buf[1]) % 31 == 0
+
+def _strip_ccb(buf):
+    """
+    Remove the NOAAPORT (SOH) or WXP (**) header lines that precede the
+    compressed product, mirroring the fgets() calls at the top of ucnids.
+    """
+    if buf[:1] == b'\x01':
+        num_lines = 4
+    elif buf[:2] == b'**':
+        num_lines = 2
+    elif buf[:1] == b'\n':
+        num_lines = 3
+    else:
+        return buf
+
+    for idx in range(num_lines):
+        buf = buf[buf.index(b'\n') + 1:]
+    return buf
+
+def inflate_nids(source):
+    """
+    Decompress a zlib-compressed NOAAPORT NIDS product in memory. This is the
+    equivalent of `ucnids -r`: the NOAAPORT header lines are dropped, each
+    4000-byte zlib block is inflated in turn, and the 24-byte CCB at the start
+    of the inflated product is stripped, leaving the WMO header expected by
+    VADFile. `source` can be the raw bytes or any object with a read() method.
+    Uncompressed products are passed through with only the NOAAPORT header
+    lines removed.
+    """
+    if hasattr(source, 'read'):
+        source = source.read()
+
+    buf = _strip_ccb(bytes(source))
+    if not _is_zlib(buf):
+        return buf
+
+    chunks = []
+    while _is_zlib(buf):
+        dcmp = zlib.decompressobj()
+        chunks.append(dcmp.decompress(buf))
+        buf = dcmp.unused_data
+        if not dcmp.eof:
+            break
+
+    # Like ucnids, trailing bytes are only kept if the last block was full
+    if len(chunks[-1]) == 4000:
+        chunks.append(buf)
+    return b''.join(chunks)[24:]
+
+def read_nids(source):
+    """
+    Inflate a compressed .nids NVW product and parse it without writing the
+    decompressed product back to disk.
+    """
+    return VADFile(io.BytesIO(inflate_nids(source)))
+
 class GSDFile(object):
     """
     Read in wind-related data in "GSD" format from rucsoundings.noaa.gov
@@ -25,188 +96,262 @@ class GSDFile(object):
         self._read()
 
 
+def _decode_packets(layer_data):
+    """
+    Split a symbology layer (an array of big-endian halfwords) into wind barbs
+    and text labels. Only the packet headers are walked in python; the barb
+    values are gathered with one fancy-indexing operation. Returns an
+    (N, 5) array of [color, x, y, direction, speed] and a list of (x, y, text).
+    """
+    starts = []
+    counts = []
+    labels = []
+
+    pos = 0
+    num_halfwords = len(layer_data)
+    while pos + 1 < num_halfwords:
+        packet_code = int(layer_data[pos])
+        packet_size = (int(layer_data[pos + 1]) + 1) // 2
+
+        if packet_code == 4:
+            # Color level, x, y, direction, speed for each barb
+            starts.append(pos + 2)
+            counts.append(packet_size // 5)
+        elif packet_code == 8:
+            # Color level, x, y, then the characters
+            x, y = int(layer_data[pos + 3]), int(layer_data[pos + 4])
+            text = layer_data[(pos + 5):(pos + 2 + packet_size)].tobytes()
+            labels.append((x, y, text[:(packet_size * 2 - 6)].decode('ascii', 'replace')))
+
+        pos += 2 + packet_size
+
+    if len(starts) == 0:
+        return np.zeros((0, 5), dtype=layer_data.dtype), labels
+
+    starts = np.array(starts)
+    counts = np.array(counts)
+    barb_starts = np.repeat(starts, counts) + 5 * (np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts))
+    return layer_data[barb_starts[:, np.newaxis] + np.arange(5)], labels
+
+# Fixed layouts of the product headers (see the Level 3 ICD). Precompiled so
+# each header is decoded with a single unpack_from() call.
+_message_header = struct.Struct('>hhiihhh')
+_product_description = struct.Struct('>hiihhhhhhhihi4h16h7hbbiii')
+_block_header = struct.Struct('>hhi')
+_halfword = struct.Struct('>h')
+
+def _parse_vad_table(vad_list):
+    """
+    Convert the lines of the VAD Algorithm Output pages into a structured array
+    (one record per line, fields as in VADFile.fields). The whole table is
+    handed to numpy's text parser in one pass; 'NA' values become NaN.
+    """
+    table_dtype = np.dtype([ (field, float) for field in VADFile.fields ])
+    if len(vad_list) == 0:
+        return np.empty(0, dtype=table_dtype)
+
+    # The VAD tables don't contain any other letters, so 'NA' can be swapped
+    # for 'nan' in the whole table at once. Columns 4-9 are VADFile.fields.
+    text = "\n".join(vad_list).replace('NA', 'nan')
+    values = np.loadtxt(text.splitlines(), usecols=range(4, 10), ndmin=2)
+
+    return np.ascontiguousarray(values).view(table_dtype).reshape(len(vad_list))
+
 class VADFile(object):
     fields = ['wind_dir', 'wind_spd', 'rms_error', 'divergence', 'slant_range', 'elev_angle']
 
-    def __init__(self, file):
-        self._rpg = file
+    def __init__(self, file, source='tabular'):
+        """
+        file can be an open file (or anything else with a read() method), or a
+        bytes, bytearray, memoryview or mmap object holding the inflated product.
+        Buffers are parsed in place with struct.unpack_from().
+
+        source picks where the profile comes from: 'tabular' (the default) parses
+        the VAD Algorithm Output text pages and skips the symbology block, while
+        'symbology' decodes the wind barb packets from the graphic and skips the
+        text pages. The barbs are then available from the barbs attribute.
+        """
+        if source not in ['tabular', 'symbology']:
+            raise ValueError("Unknown VAD data source '%s'." % source)
+
+        if hasattr(file, 'read') and not isinstance(file, mmap.mmap):
+            file = file.read()
+
         self._data = None
+        self._barbs = None
+        self._wind = None
+        self._offset = 0
 
-        self._read_headers()
-        has_symbology_block, has_graphic_block, has_tabular_block = self._read_product_description_block()
+        with memoryview(file) as self._rpg:
+            self._read_headers()
+            has_symbology_block, has_graphic_block, has_tabular_block = self._read_product_description_block()
+            offset_symbology, offset_graphic, offset_tabular = self._block_offsets
 
-        if has_symbology_block:
-            self._read_product_symbology_block()
+            if source == 'symbology':
+                if not has_symbology_block:
+                    raise IOError("This file has no product symbology block.")
 
-        if has_graphic_block:
-            pass
+                self._seek_block(offset_symbology)
+                self._read_product_symbology_block()
 
-        if has_tabular_block:
-            self._read_tabular_block()
+            elif has_tabular_block:
+                self._seek_block(offset_tabular)
+                self._read_tabular_block()
 
-        self._data = self._get_data()
+        self._rpg = None
+        if source == 'symbology':
+            self._data = self._get_barb_data()
+        else:
+            self._data = self._get_data()
         return
 
+    def _seek_block(self, block_offset):
+        # Block offsets are in halfwords from the start of the message header,
+        # which follows the 30-byte WMO header.
+        self._offset = 30 + block_offset * 2
+
     def _read_headers(self):
         wmo_header = self._read('s30')
 
-        message_code = self._read('h')
-        message_date = self._read('h')
-        message_time = self._read('i')
-        message_length = self._read('i')
-        source_id = self._read('h')
-        dest_id = self._read('h')
-        num_blocks = self._read('h')
+        (message_code, message_date, message_time, message_length, source_id,
+            dest_id, num_blocks) = self._unpack(_message_header)
 
         return
 
-    def _read_product_description_block(self):
-        self._read('h') # Block separator
-        self._radar_latitude  = self._read('i') / 1000.
-        self._radar_longitude = self._read('i') / 1000.
-        self._radar_elevation = self._read('h')
-
-        product_code = self._read('h')
-        if product_code != 48:
-            raise IOError("This isn't a VWP file.")
-
-        operational_mode    = self._read('h')
-        self._vcp           = self._read('h')
-        req_sequence_number = self._read('h')
-        vol_sequence_number = self._read('h')
+    def _read_product_description(self):
+        # Shared by the product description block and the copy of it at the
+        # start of the tabular block.
+        pdb = self._unpack(_product_description)
+
+        # pdb[0] is the block separator
+        product = {
+            'latitude':         pdb[1] / 1000.,
+            'longitude':        pdb[2] / 1000.,
+            'elevation':        pdb[3],
+            'product_code':     pdb[4],
+            'operational_mode': pdb[5],
+            'vcp':              pdb[6],
+            'scan_date':        pdb[9],
+            'scan_time':        pdb[10],
+            'offset_symbology': pdb[42],
+            'offset_graphic':   pdb[43],
+            'offset_tabular':   pdb[44],
+        }
+        # pdb[7:9] are the request and volume sequence numbers, pdb[11:13] the
+        # product date and time, pdb[13:40] the product-dependent variables and
+        # thresholds (mostly unused), and pdb[40:42] the version and spot blank.
+        return product
 
-        scan_date    = self._read('h')
-        scan_time    = self._read('i')
-        product_date = self._read('h')
-        product_time = self._read('i')
-
-        self._read('h')   # Product-dependent variable 1 (unused)
-        self._read('h')   # Product-dependent variable 2 (unused)
-        self._read('h')   # Elevation (unused)
-        self._read('h')   # Product-dependent variable 3 (unused)
-        self._read('16h') # Product-dependent thresholds (how do I interpret these?)
-        self._read('7h')  # Product-dependent variables 4-10 (mostly unused ... do I need the max?)
+    def _read_product_description_block(self):
+        product = self._read_product_description()
 
-        version    = self._read('b')
-        spot_blank = self._read('b')
+        self._radar_latitude  = product['latitude']
+        self._radar_longitude = product['longitude']
+        self._radar_elevation = product['elevation']
 
-        offset_symbology = self._read('i')
-        offset_graphic   = self._read('i')
-        offset_tabular   = self._read('i')
+        if product['product_code'] != 48:
+            raise IOError("This isn't a VWP file.")
 
-        self._time = datetime(1969, 12, 31, 0, 0, 0) + timedelta(days=scan_date, seconds=scan_time)
+        self._vcp = product['vcp']
+        self._block_offsets = (product['offset_symbology'], product['offset_graphic'], product['offset_tabular'])
+        self._time = datetime(1969, 12, 31, 0, 0, 0) + timedelta(days=product['scan_date'], seconds=product['scan_time'])
 
-        return offset_symbology > 0, offset_graphic > 0, offset_tabular > 0
+        return product['offset_symbology'] > 0, product['offset_graphic'] > 0, product['offset_tabular'] > 0
 
     def _read_product_symbology_block(self):
-        self._read('h') # Block separator
-        block_id = self._read('h')
+        block_separator, block_id, block_length = self._unpack(_block_header)
 
         if block_id != 1:
             raise IOError("This isn't the product symbology block.")
 
-        block_length    = self._read('i')
-        num_layers      = self._read('h')
-        layer_separator = self._read('h')
-        layer_num_bytes = self._read('i')
-        block_data      = self._read('%dh' % int(layer_num_bytes / struct.calcsize('h')))
-
-        packet_code = -1
-        packet_size = -1
-        packet_counter = -1
-        packet_value = -1
-        packet = []
-        for item in block_data:
-            if packet_code == -1:
-                packet_code = item
-            elif packet_size == -1:
-                packet_size = item
-                packet_counter = 0
-            elif packet_value == -1:
-                packet_value = item
-                packet_counter += struct.calcsize('h')
-            else:
-                packet.append(item)
-                packet_counter += struct.calcsize('h')
-
-                if packet_counter == packet_size:
-                    if packet_code == 8:
-                        str_data = struct.pack('>%dh' % int(packet_size / struct.calcsize('h') - 3), *packet[2:])
-                    elif packet_code == 4:
-                        pass
-
-                    packet = []
-                    packet_code = -1
-                    packet_size = -1
-                    packet_counter = -1
-                    packet_value = -1
+        num_layers = self._read('h')
+
+        barbs = []
+        labels = []
+        for layer in range(num_layers):
+            layer_separator = self._read('h')
+            layer_num_bytes = self._read('i')
+
+            layer_data = np.frombuffer(self._rpg, dtype='>i2', count=layer_num_bytes // 2, offset=self._offset)
+            layer_barbs, layer_labels = _decode_packets(layer_data)
+            barbs.append(layer_barbs)
+            labels.extend(layer_labels)
+
+            self._offset += layer_num_bytes
+
+        # Copy out of the buffer so it can be released (e.g. an mmap closed)
+        barbs = np.concatenate(barbs).astype(int)
+        self._barbs = {
+            'rms_level': barbs[:, 0],
+            'x':         barbs[:, 1],
+            'y':         barbs[:, 2],
+            'wind_dir':  barbs[:, 3].astype(float),
+            'wind_spd':  barbs[:, 4].astype(float),
+        }
+        self._barbs['altitude'] = self._barb_altitude(labels, self._barbs['y'])
         return
 
+    def _barb_altitude(self, labels, barb_y):
+        # The altitude axis of the graphic is a column of numeric text labels
+        # (thousands of feet MSL) to the left of the barbs. Interpolate the barb
+        # y positions between them and convert to km above the radar.
+        numeric = [ (x, y, float(text)) for x, y, text in labels if text.strip().isdigit() ]
+        if len(numeric) < 2:
+            return np.nan * np.ones(barb_y.shape)
+
+        axis_x = min(x for x, y, kft in numeric)
+        axis = sorted((y, kft) for x, y, kft in numeric if x == axis_x)
+        if len(axis) < 2:
+            return np.nan * np.ones(barb_y.shape)
+
+        axis_y, axis_kft = [ np.array(v, dtype=float) for v in zip(*axis) ]
+        kft = np.interp(barb_y, axis_y, axis_kft, left=np.nan, right=np.nan)
+        return (kft * 1000. - self._radar_elevation) * 0.3048 / 1000.
+
     def _read_tabular_block(self):
-        self._read('h')
-        block_id = self._read('h')
+        block_separator, block_id, block_size = self._unpack(_block_header)
         if block_id != 3:
             raise IOError("This isn't the tabular block.")
 
-        block_size = self._read('i')
-
-        self._read('h')
-        self._read('h')
-        self._read('i')
-        self._read('i')
-        self._read('h')
-        self._read('h')
-        self._read('h')
-
-        self._read('h')
-        self._read('i')
-        self._read('i')
-        self._read('h')
-        product_code = self._read('h')
-
-        operational_mode    = self._read('h')
-        vcp                 = self._read('h')
-        req_sequence_number = self._read('h')
-        vol_sequence_number = self._read('h')
-
-        scan_date    = self._read('h')
-        scan_time    = self._read('i')
-        product_date = self._read('h')
-        product_time = self._read('i')
-
-        self._read('h')   # Product-dependent variable 1 (unused)
-        self._read('h')   # Product-dependent variable 2 (unused)
-        self._read('h')   # Elevation (unused)
-        self._read('h')   # Product-dependent variable 3 (unused)
-        self._read('16h') # Product-dependent thresholds (how do I interpret these?)
-        self._read('7h')  # Product-dependent variables 4-10 (mostly unused ... do I need the max?)
-
-        version    = self._read('b')
-        spot_blank = self._read('b')
-
-        offset_symbology = self._read('i')
-        offset_graphic   = self._read('i')
-        offset_tabular   = self._read('i')
-
-        self._read('h') # Block separator
+        # The tabular block repeats the message header and product description
+        self._unpack(_message_header)
+        self._read_product_description()
+
+        block_separator = self._read('h')
         num_pages = self._read('h')
+
+        rpg = self._rpg
+        offset = self._offset
         self._text_message = []
         for idx in range(num_pages):
-            num_chars = self._read('h')
+            num_chars, = _halfword.unpack_from(rpg, offset)
+            offset += _halfword.size
             self._text_message.append([])
             while num_chars != -1:
-                self._text_message[-1].append(self._read("s%d" % num_chars))
-                num_chars = self._read('h')
+                line = bytes(rpg[offset:(offset + num_chars)])
+                self._text_message[-1].append(line.strip(b"\0").decode('utf-8'))
+                offset += num_chars
+
+                num_chars, = _halfword.unpack_from(rpg, offset)
+                offset += _halfword.size
 
+        self._offset = offset
         return
 
+    def _unpack(self, layout):
+        data = layout.unpack_from(self._rpg, self._offset)
+        self._offset += layout.size
+        return data
+
     def _read(self, type_string):
         if type_string[0] != 's':
-            size = struct.calcsize(type_string)
-            data = struct.unpack(">%s" % type_string, self._rpg.read(size))
+            type_string = ">%s" % type_string
+            data = struct.unpack_from(type_string, self._rpg, self._offset)
+            self._offset += struct.calcsize(type_string)
         else:
             size = int(type_string[1:])
-            data = tuple([ self._rpg.read(size).strip(b"\0").decode('utf-8') ])
+            data = tuple([ bytes(self._rpg[self._offset:(self._offset + size)]).strip(b"\0").decode('utf-8') ])
+            self._offset += size
 
         if len(data) == 1:
             return data[0]
@@ -219,24 +364,11 @@ class VADFile(object):
             if (page[0].strip())[:20] == "VAD Algorithm Output":
                 vad_list.extend(page[3:])
 
-        data = dict((k, []) for k in VADFile.fields)
-
         if self._vcp in [80, 90]:
             vad_list = vad_list[1:-1]
-        
-        for line in vad_list:
-            values = line.strip().split()
-            data['wind_dir'].append(float(values[4]))
-            data['wind_spd'].append(float(values[5]))
-            data['rms_error'].append(float(values[6]))
-            data['divergence'].append(float(values[7]) if values[7] != 'NA' else np.nan)
-            data['slant_range'].append(float(values[8]))
-            data['elev_angle'].append(float(values[9]))
-
-
-        for key, val in data.items():
-            data[key] = np.array(val)
 
+        table = _parse_vad_table(vad_list)
+        data = dict((k, table[k]) for k in VADFile.fields)
 
         data['slant_range'] *= 6067.1 / 3281.
 
@@ -248,6 +380,64 @@ class VADFile(object):
             data[key] = val[order]
         return data
 
+    def _get_barb_data(self):
+        # The rightmost column of barbs is the current volume scan. The graphic
+        # only carries an RMS color category, not the error itself, and has no
+        # divergence or geometry information.
+        barbs = self._barbs
+        if len(barbs['x']) > 0:
+            latest = barbs['x'] == barbs['x'].max()
+        else:
+            latest = np.zeros(0, dtype=bool)
+
+        data = {
+            'wind_dir':  barbs['wind_dir'][latest],
+            'wind_spd':  barbs['wind_spd'][latest],
+            'altitude':  barbs['altitude'][latest],
+        }
+        for key in ['rms_error', 'divergence', 'slant_range', 'elev_angle']:
+            data[key] = np.nan * np.ones(data['altitude'].shape)
+
+        order = np.argsort(data['altitude'])
+        for key, val in data.items():
+            data[key] = val[order]
+        return data
+
+    @classmethod
+    def from_arrays(cls, data, time, vcp, radar_location=(np.nan, np.nan, np.nan)):
+        """
+        Build a VADFile from already-parsed arrays (as produced by _get_data)
+        without going through a product. radar_location is the latitude,
+        longitude and elevation of the radar.
+        """
+        vad = cls.__new__(cls)
+        vad._data = dict((key, np.asarray(val)) for key, val in data.items())
+        vad._barbs = None
+        vad._wind = None
+        vad._time = time
+        vad._vcp = vcp
+        vad._radar_latitude, vad._radar_longitude, vad._radar_elevation = radar_location
+        return vad
+
+    @property
+    def barbs(self):
+        """
+        Wind barbs decoded from the symbology block (source='symbology' only),
+        as a dict of arrays: rms_level (color level), x, y, wind_dir, wind_spd
+        and altitude (km).
+        """
+        return self._barbs
+
+    @property
+    def wind(self):
+        """
+        The WindProfile for this file, so u/v and anything derived from them
+        are only computed once.
+        """
+        if self._wind is None:
+            self._wind = WindProfile(self)
+        return self._wind
+
     def __getitem__(self, key):
         if key == 'time':
             val = self._time
@@ -255,6 +445,16 @@ class VADFile(object):
             val = self._data[key]
         return val
 
+    def copy(self):
+        """
+        A copy of this file that add_surface_wind can change without changing
+        this one. The arrays themselves are shared.
+        """
+        vad = copy.copy(self)
+        vad._data = dict(self._data)
+        vad._wind = None
+        return vad
+
     def add_surface_wind(self, sfc_wind):
         sfc_dir, sfc_spd = sfc_wind
 
@@ -263,6 +463,95 @@ class VADFile(object):
 
         for key, val in zip(keys, vals):
             self._data[key] = np.append(val, self._data[key])
+        self._wind = None
+
+class VWPCube(object):
+    """
+    A time-height cross section built from a list of VAD profiles. Each field
+    is a masked (time x level) array. Profiles keep their own heights, starting
+    at level 0; levels above the top of a shorter profile (or any other missing
+    values) are masked.
+    """
+    fields = ['wind_dir', 'wind_spd', 'rms_error', 'altitude']
+
+    def __init__(self, profiles, times=None):
+        if times is None:
+            times = [ prof['time'] for prof in profiles ]
+
+        num_levels = max([ len(prof['altitude']) for prof in profiles ] + [0])
+
+        data = {}
+        for key in VWPCube.fields:
+            values = np.nan * np.ones((len(profiles), num_levels))
+            for idx, prof in enumerate(profiles):
+                values[idx, :len(prof[key])] = prof[key]
+            data[key] = values
+
+        self._set_data(data, times)
+
+        if len(profiles) > 0 and hasattr(profiles[0], 'rid'):
+            self.rid = profiles[0].rid
+
+    @classmethod
+    def _from_arrays(cls, data, times, rid=None):
+        cube = cls.__new__(cls)
+        cube._set_data(data, times)
+        if rid is not None:
+            cube.rid = rid
+        return cube
+
+    def _set_data(self, data, times):
+        self.times = list(times)
+        self._data = dict((key, np.ma.masked_invalid(data[key])) for key in VWPCube.fields)
+
+    def __len__(self):
+        return len(self.times)
+
+    def __getitem__(self, key):
+        """
+        cube['wind_dir'] (or any of fields, 'u' or 'v') returns a masked
+        (time x level) array; cube[idx] or cube[start:stop] returns a new cube
+        with only those times.
+        """
+        if isinstance(key, str):
+            if key in ['u', 'v']:
+                u, v = vec2comp(self._data['wind_dir'], self._data['wind_spd'])
+                return u if key == 'u' else v
+            elif key == 'time':
+                return self.times
+            return self._data[key]
+
+        idxs = np.arange(len(self.times))[key]
+        idxs = np.atleast_1d(idxs)
+        data = dict((k, v.filled(np.nan)[idxs]) for k, v in self._data.items())
+        return VWPCube._from_arrays(data, [ self.times[idx] for idx in idxs ], getattr(self, 'rid', None))
+
+    def time_slice(self, start=None, end=None):
+        """
+        Return a new cube with only the times between start and end (inclusive).
+        """
+        idxs = [ idx for idx, time in enumerate(self.times) if (start is None or time >= start) and (end is None or time <= end) ]
+        return self[idxs]
+
+    def regrid(self, heights):
+        """
+        Interpolate every profile to the same heights (km) and return a new cube.
+        Winds are interpolated as u and v components; values outside the range
+        of a profile are masked.
+        """
+        heights = np.asarray(heights, dtype=float)
+        alt = self._data['altitude'].filled(np.nan)
+
+        u, v = vec2comp(self._data['wind_dir'].filled(np.nan), self._data['wind_spd'].filled(np.nan))
+        wind_dir, wind_spd = comp2vec(_interp(heights, alt, u), _interp(heights, alt, v))
+
+        data = {
+            'wind_dir':  wind_dir,
+            'wind_spd':  wind_spd,
+            'rms_error': _interp(heights, alt, self._data['rms_error'].filled(np.nan)),
+            'altitude':  heights * np.ones(wind_dir.shape),
+        }
+        return VWPCube._from_arrays(data, self.times, getattr(self, 'rid', None))
 
 def find_file_times(rid):
     url = "%s/SI.%s/" % (_base_url, rid.lower())
@@ -2,13 +2,17 @@ from __future__ import print_function
 
 import numpy as np
 
+import os
 import sys
 #import ast
 
-from vad_reader import download_vwp, VADFile
+from vad_reader import download_vwp
+from vad_cache import load_vad, CACHE_DIR
 from params import compute_parameters
 from plot import plot_vwp
 from wsr88d import nwswfos
+import runstats
+from profiling import profile_call
 
 import re
 import argparse
@@ -57,7 +61,7 @@ def parse_time(time_str):
 
     return plot_time
 
-def vwp_plotter(radar_id, time=None, fname=None, local_path=None, web=False, fixed=False, add_hodo=False, comp_rap=False):
+def vwp_plotter(radar_id, time=None, fname=None, local_path=None, web=False, fixed=False, add_hodo=False, comp_rap=False, cache_dir=CACHE_DIR):
     #add_hodo = ast.literal_eval(add_hodo)
     #comp_rap = ast.literal_eval(comp_rap)
 
@@ -80,11 +84,12 @@ def vwp_plotter(radar_id, time=None, fname=None, local_path=None, web=False, fix
 
         for iname in inames:
             try:
-                vad = VADFile(open(iname, 'rb'))
+                with runstats.span('parse', file=iname, bytes=os.path.getsize(iname)):
+                    vad = load_vad(iname, cache_dir=cache_dir)
                 data.append(vad)
                 ts = datetime.strptime(iname[-12:], "%Y%m%d%H%M")
                 times.append(ts)
-            except:
+            except Exception:
                 raise ValueError("Could not add '%s'" % iname)
                 data.append([])
         
@@ -113,7 +118,8 @@ def vwp_plotter(radar_id, time=None, fname=None, local_path=None, web=False, fix
     #if comp_rap:
     #    rap_data = download_rap(site_id, time=
     #else:
-    plot_vwp(vwp, times, params, add_hodo=add_hodo, fname=fname, web=web, fixed=fixed, archive=(local_path is not None))
+    with runstats.span('render', count=len(vwp)):
+        plot_vwp(vwp, times, params, add_hodo=add_hodo, fname=fname, web=web, fixed=fixed, archive=(local_path is not None))
 
 
 def main():
@@ -126,21 +132,30 @@ def main():
     ap.add_argument('-p', '--local-path', dest='local_path', help="Path to local data. If not given, download from the Internet.")
     ap.add_argument('-w', '--web-mode', dest='web', action='store_true')
     ap.add_argument('-x', '--fixed-frame', dest='fixed', action='store_true')
+    ap.add_argument('--no-cache', dest='no_cache', action='store_true', help="Don't use (or update) the cache of parsed local files.")
+    ap.add_argument('--profile', dest='profile', help="Profile the run and write the stats to this file (.pstats), or collapsed stacks for a flame graph if it ends in .folded.")
+    ap.add_argument('--profile-top', dest='profile_top', type=int, default=15, help="Number of functions per module in the profile summary. Defaults to 15.")
     args = ap.parse_args()
 
     np.seterr(all='ignore')
 
+    kwargs = dict(
+        time=args.time,
+        fname=args.img_name,
+        local_path=args.local_path,
+        web=args.web,
+        add_hodo=args.add_hodo,
+        comp_rap=args.comp_rap,
+        fixed=args.fixed,
+        cache_dir=None if args.no_cache else CACHE_DIR
+    )
+
     try:
-        vwp_plotter(args.radar_id,
-            time=args.time,
-            fname=args.img_name,
-            local_path=args.local_path,
-            web=args.web,
-            add_hodo=args.add_hodo,
-            comp_rap=args.comp_rap,
-            fixed=args.fixed
-        )
-    except:
+        if args.profile is not None:
+            profile_call(args.profile, vwp_plotter, args.radar_id, top=args.profile_top, **kwargs)
+        else:
+            vwp_plotter(args.radar_id, **kwargs)
+    except Exception:
         if args.web:
             print(json.dumps({'error':'error'}))
         else:
@@ -0,0 +1,74 @@
+from __future__ import print_function
+
+import os
+import zipfile
+
+import runstats
+
+"""
+zipsink.py
+Writes output files into a zip archive as they're produced, rather than
+archiving the whole directory at the end. Images are already compressed, so
+they're stored as-is; everything else is deflated.
+"""
+
+_stored_exts = ['.png', '.gif', '.mp4', '.jpg', '.jpeg']
+
+class ZipSink(object):
+    def __init__(self, zip_path, root, include_data=True):
+        """
+        Open zip_path for writing. Files are stored under their path relative
+        to root. If include_data is False, only images are added.
+        """
+        self.zip_path = zip_path
+        self.root = root
+        self.include_data = include_data
+        self._names = set()
+        self._zip = zipfile.ZipFile(zip_path + '.part', 'w', zipfile.ZIP_DEFLATED, allowZip64=True)
+
+    def __call__(self, path):
+        self.add(path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # A run that failed part way doesn't leave a zip that looks complete
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+    def add(self, path):
+        """
+        Add the file at path to the archive. Files that have already been added
+        and (without include_data) data files are skipped.
+        """
+        arcname = os.path.relpath(path, self.root)
+        is_image = os.path.splitext(path)[1].lower() in _stored_exts
+        if arcname in self._names or not (is_image or self.include_data):
+            return
+
+        compress_type = zipfile.ZIP_STORED if is_image else zipfile.ZIP_DEFLATED
+        with runstats.span('zip', file=arcname, bytes=os.path.getsize(path)):
+            self._zip.write(path, arcname, compress_type=compress_type)
+        self._names.add(arcname)
+
+    def close(self):
+        if self._zip is None:
+            return
+
+        self._zip.close()
+        self._zip = None
+        os.replace(self.zip_path + '.part', self.zip_path)
+
+    def discard(self):
+        """
+        Close the archive without publishing it, and remove the partial file.
+        """
+        if self._zip is None:
+            return
+
+        self._zip.close()
+        self._zip = None
+        os.remove(self.zip_path + '.part')